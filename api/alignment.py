@@ -0,0 +1,102 @@
+import numpy as np
+
+# Supported ways of pairing reference frames with student frames
+#  - "zip": frame i of one video is compared against frame i of the other (truncates to the shorter video)
+#  - "dtw": dynamic time warping restricted to a Sakoe-Chiba band around the diagonal
+ALIGNMENT_MODES = ("zip", "dtw")
+
+# Move taken to reach a cell of the DTW matrix, used when backtracking the warping path
+_DIAGONAL, _UP, _LEFT = 0, 1, 2
+
+
+def zip_path(length1: int, length2: int):
+    '''
+    Pairs frame i with frame i, dropping the tail of the longer video
+    '''
+    frames = np.arange(min(length1, length2))
+    return np.stack([frames, frames], axis=1)
+
+
+def dtw_path(features1, features2, band: int):
+    '''
+    Windowed dynamic time warping between two sequences of unit-length feature vectors.
+    '''
+    n, m = len(features1), len(features2)
+    if n == 0 or m == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # The band must be at least as wide as the diagonal's slope or rows would not connect
+    band = max(int(band), int(np.ceil(m / n)), 1)
+
+    # Band centre follows the diagonal from (0, 0) to (n - 1, m - 1)
+    centers = np.round(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(np.int64)
+    lows = np.clip(centers - band, 0, m - 1)
+    highs = np.clip(centers + band, 0, m - 1)
+    width = 2 * band + 1
+
+    directions = np.zeros((n, width), dtype=np.int8)
+    prev_row = None
+    prev_low = prev_high = 0
+
+    for i in range(n):
+        low, high = lows[i], highs[i]
+        cols = np.arange(low, high + 1)
+        cost = 1.0 - features2[low:high + 1] @ features1[i]
+
+        if prev_row is None:
+            # Path has to start at (0, 0)
+            best_prev = np.full(len(cols), np.inf)
+            best_prev[0] = 0.0
+            from_dir = np.full(len(cols), _DIAGONAL, dtype=np.int8)
+        else:
+            up = np.full(len(cols), np.inf)
+            in_prev = (cols >= prev_low) & (cols <= prev_high)
+            up[in_prev] = prev_row[cols[in_prev] - prev_low]
+
+            diag = np.full(len(cols), np.inf)
+            in_prev = (cols - 1 >= prev_low) & (cols - 1 <= prev_high)
+            diag[in_prev] = prev_row[cols[in_prev] - 1 - prev_low]
+
+            best_prev = np.minimum(diag, up)
+            from_dir = np.where(diag <= up, _DIAGONAL, _UP).astype(np.int8)
+
+        # Resolve the left-neighbour dependency within the row without a Python loop:
+        # D[j] = min_k<=j (a[k] + c[k+1] + ... + c[j]) = S[j] + min_k<=j (a[k] - S[k])
+        candidate = cost + best_prev
+        running = np.cumsum(cost)
+        offset = candidate - running
+        best_offset = np.minimum.accumulate(offset)
+        row = running + best_offset
+
+        from_left = offset > best_offset
+        directions[i, :len(cols)] = np.where(from_left, _LEFT, from_dir)
+
+        prev_row, prev_low, prev_high = row, low, high
+
+    # Backtrack from the end of both sequences
+    path = []
+    i, j = n - 1, m - 1
+    while True:
+        path.append((i, j))
+        if i == 0 and j == 0:
+            break
+        move = directions[i, j - lows[i]]
+        if move == _DIAGONAL:
+            i, j = i - 1, j - 1
+        elif move == _UP:
+            i -= 1
+        else:
+            j -= 1
+
+    return np.array(path[::-1], dtype=np.int64)
+
+
+def align_frames(features1, features2, mode: str = "zip", band: int = 30):
+    '''
+    Returns the (steps, 2) warping path pairing frames of the first video with the second
+    '''
+    if mode == "zip":
+        return zip_path(len(features1), len(features2))
+    if mode == "dtw":
+        return dtw_path(features1, features2, band)
+    raise ValueError(f"Unknown alignment mode '{mode}'. Expected one of: {', '.join(ALIGNMENT_MODES)}")
@@ -1,5 +1,7 @@
 import os
-from db_connect import connect
+from db_connect import connect, async_connect
+from timeline_crud import add_source_to_timeline, remove_source_from_timeline
+from search import normalize_search_query, like_pattern, search_cache, SEARCH_RESULTS_LIMIT
 from models import ClubEvent, ClubPost, UserPost, postsUserRequest, postsClubRequest, EventInterest
 from datetime import datetime
 
@@ -75,10 +77,8 @@ def create_new_club(owner: int, name: str, description: str, club_tag: str):
                 (owner, name, description, club_tag)
             )
             club_id = cursor.fetchone()[0]
-            conn.commit()
-        
-    with connect() as conn:
-        with conn.cursor() as cursor:
+
+            # The owner is the first member, added in the same transaction as the club
             cursor.execute(f"INSERT INTO {MEMBERSHIPS_TABLE} (club_id, user_id) VALUES (%s, %s)", (club_id, owner))
             conn.commit()
 
@@ -122,6 +122,9 @@ def add_member_to_club(club_id: int, user_id: int):
                 """,
                 (user_id, club_id)
             )
+            # The club's earlier posts join the new member's home timeline
+            if cursor.rowcount > 0:
+                add_source_to_timeline(cursor, user_id, "club", club_id)
             conn.commit()
 
 # # Function to remove a member from a club
@@ -129,24 +132,33 @@ def remove_member_from_club(club_id: int, user_id: int):
     with connect() as conn:
         with conn.cursor() as cursor:
             cursor.execute(f"DELETE FROM {MEMBERSHIPS_TABLE} WHERE club_id = %s AND user_id = %s", (club_id, user_id))
+            remove_source_from_timeline(cursor, user_id, "club", club_id)
             conn.commit()
 
-def search_clubs_db(query: str):
+# Clubs whose name or tag contains a search, most similar first, with parameters like_pattern(query), query and limit
+CLUB_SEARCH_QUERY = f"""
+    SELECT id, owner, name, description, club_tag FROM {CLUBS_TABLE}
+    WHERE name ILIKE $1 OR club_tag ILIKE $1
+    ORDER BY GREATEST(similarity(name, $2), similarity(club_tag, $2)) DESC, name
+    LIMIT $3
+"""
+
+async def search_clubs_db(query: str):
     """
-    Searches for clubs by name or club_tag (partial match).
-    Returns a list of matching clubs.
+    Searches for clubs by name or club_tag (partial match), most similar first.
+    Returns a list of at most SEARCH_RESULTS_LIMIT matching clubs.
     """
-    with connect() as conn:
-        with conn.cursor() as cursor:
-            sql = "SELECT * FROM clubs WHERE name ILIKE %s OR club_tag ILIKE %s"
-            cursor.execute(sql, (f"%{query}%", f"%{query}%"))
-            clubs = cursor.fetchall()
-
-            if not clubs:
-                return []
-
-            club_col_names = [desc[0] for desc in cursor.description]
-            return [dict(zip(club_col_names, row)) for row in clubs]
+    query = normalize_search_query(query)
+    cache_key = ("clubs", query)
+    clubs = search_cache.get(cache_key)
+    if clubs is not None:
+        return clubs
+
+    async with async_connect() as conn:
+        clubs = await conn.fetch(CLUB_SEARCH_QUERY, like_pattern(query), query, SEARCH_RESULTS_LIMIT)
+    clubs = [dict(club) for club in clubs]
+    search_cache.put(cache_key, clubs)
+    return clubs
 
 
 # # Function to get all members of a club
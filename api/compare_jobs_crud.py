@@ -0,0 +1,145 @@
+from db_connect import connect
+from psycopg2.extras import Json
+
+# Table name MACROS
+COMPARE_JOBS_TABLE = "compare_jobs"
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class CompareJobLostError(Exception):
+    pass
+
+
+# Function to queue a new comparison job
+def create_compare_job(video1_path: str, video2_path: str, alignment: str, quality: str):
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {COMPARE_JOBS_TABLE} (status, video1_path, video2_path, alignment, quality) VALUES (%s, %s, %s, %s, %s) RETURNING id",
+                (JOB_QUEUED, video1_path, video2_path, alignment, quality)
+            )
+            job_id = cursor.fetchone()[0]
+            conn.commit()
+
+    return job_id
+
+# Function to get the status of a comparison job
+def get_compare_job(job_id: int):
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, status, frames_processed, frames_total, result, error FROM {COMPARE_JOBS_TABLE} WHERE id = %s",
+                (job_id,)
+            )
+            job = cursor.fetchone()
+
+            if job is None:
+                raise ValueError(f"Comparison job {job_id} not found.")
+
+            return {
+                "job_id": job[0],
+                "status": job[1],
+                "frames_processed": job[2],
+                "frames_total": job[3],
+                "result": job[4],
+                "error": job[5],
+            }
+
+# Function for a worker to take the oldest queued job. Returns None if the queue is empty.
+def claim_next_compare_job():
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            # SKIP LOCKED lets several workers poll the queue without handing out the same job twice
+            cursor.execute(f"""
+                UPDATE {COMPARE_JOBS_TABLE}
+                SET status = %s, attempts = attempts + 1, updated_on = now()
+                WHERE id = (
+                    SELECT id FROM {COMPARE_JOBS_TABLE}
+                    WHERE status = %s
+                    ORDER BY id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, video1_path, video2_path, alignment, quality, attempts
+            """, (JOB_RUNNING, JOB_QUEUED))
+            job = cursor.fetchone()
+            conn.commit()
+
+    if job is None:
+        return None
+
+    # The attempt number identifies this claim: the job may be requeued and claimed again later
+    return {"job_id": job[0], "video1_path": job[1], "video2_path": job[2], "alignment": job[3], "quality": job[4], "attempt": job[5]}
+
+# Function to record progress of a running job; also acts as the worker's heartbeat.
+# Raises CompareJobLostError if the job was requeued or claimed again since this attempt claimed it.
+def update_compare_job_progress(job_id: int, attempt: int, frames_processed: int, frames_total: int):
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {COMPARE_JOBS_TABLE}
+                SET frames_processed = %s, frames_total = %s, updated_on = now()
+                WHERE id = %s AND status = %s AND attempts = %s
+            """, (frames_processed, frames_total, job_id, JOB_RUNNING, attempt))
+            updated = cursor.rowcount
+            conn.commit()
+
+    if updated == 0:
+        raise CompareJobLostError(f"Comparison job {job_id} is no longer held by attempt {attempt}.")
+
+# Function to store the result of a finished job. Returns False, storing nothing, if the job
+# was requeued or claimed again since this attempt claimed it.
+def complete_compare_job(job_id: int, attempt: int, result: dict):
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {COMPARE_JOBS_TABLE}
+                SET status = %s, result = %s, frames_processed = frames_total, updated_on = now()
+                WHERE id = %s AND status = %s AND attempts = %s
+            """, (JOB_DONE, Json(result), job_id, JOB_RUNNING, attempt))
+            updated = cursor.rowcount
+            conn.commit()
+
+    return updated == 1
+
+# Function to mark a job as failed. Returns False, like complete_compare_job, if this attempt no longer holds the job.
+def fail_compare_job(job_id: int, attempt: int, error: str):
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {COMPARE_JOBS_TABLE}
+                SET status = %s, error = %s, updated_on = now()
+                WHERE id = %s AND status = %s AND attempts = %s
+            """, (JOB_FAILED, error[:2000], job_id, JOB_RUNNING, attempt))
+            updated = cursor.rowcount
+            conn.commit()
+
+    return updated == 1
+
+# Function to put jobs whose worker died (no heartbeat for stale_seconds) back on the queue.
+# Jobs that have already been attempted max_attempts times are failed instead.
+# Returns (id, video1_path, video2_path) of the failed jobs so their uploads can be cleaned up.
+def requeue_stale_compare_jobs(stale_seconds: int, max_attempts: int):
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                UPDATE {COMPARE_JOBS_TABLE}
+                SET status = %s, updated_on = now()
+                WHERE status = %s AND updated_on < now() - %s * INTERVAL '1 second' AND attempts < %s
+            """, (JOB_QUEUED, JOB_RUNNING, stale_seconds, max_attempts))
+
+            cursor.execute(f"""
+                UPDATE {COMPARE_JOBS_TABLE}
+                SET status = %s, error = %s, updated_on = now()
+                WHERE status = %s AND updated_on < now() - %s * INTERVAL '1 second'
+                RETURNING id, video1_path, video2_path
+            """, (JOB_FAILED, "Comparison worker stopped responding.", JOB_RUNNING, stale_seconds))
+            failed = cursor.fetchall()
+            conn.commit()
+
+    return failed
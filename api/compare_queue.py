@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Comparisons allowed to run at the same time
+COMPARE_CONCURRENCY = int(os.environ.get("COMPARE_CONCURRENCY", "2"))
+
+# Comparisons allowed in the system at once (running + waiting); beyond this requests are rejected
+COMPARE_QUEUE_LIMIT = int(os.environ.get("COMPARE_QUEUE_LIMIT", "8"))
+
+# Suggested back-off sent to clients in the Retry-After header when the queue is full
+COMPARE_RETRY_AFTER_SECONDS = int(os.environ.get("COMPARE_RETRY_AFTER_SECONDS", "30"))
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class ComparisonExecutor:
+    """
+    Bounded executor that runs comparisons off the event loop.
+    """
+
+    def __init__(self, concurrency: int = COMPARE_CONCURRENCY, limit: int = COMPARE_QUEUE_LIMIT):
+        self.concurrency = concurrency
+        self.limit = max(limit, concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="compare")
+        self._lock = threading.Lock()
+        self._accepted = 0
+        self._running = 0
+
+    def is_full(self):
+        with self._lock:
+            return self._accepted >= self.limit
+
+    def submit(self, fn, *args, **kwargs):
+        '''
+        Schedules fn(*args, **kwargs), returning a concurrent Future.
+        Raises QueueFullError if the executor is already at its limit.
+        '''
+        with self._lock:
+            if self._accepted >= self.limit:
+                raise QueueFullError(f"Comparison queue is full ({self.limit} jobs)")
+            self._accepted += 1
+
+        def run():
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        try:
+            future = self._executor.submit(run)
+        except Exception:
+            self._task_done(None)
+            raise
+
+        # Runs once the job finishes, fails or is cancelled before it started, so no slot is ever lost
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future):
+        with self._lock:
+            self._accepted -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": self._accepted - self._running,
+                "concurrency": self.concurrency,
+                "limit": self.limit,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_compare_executor = None
+_compare_executor_lock = threading.Lock()
+
+def get_compare_executor():
+    '''
+    Returns the process-wide comparison executor
+    '''
+    global _compare_executor
+    with _compare_executor_lock:
+        if _compare_executor is None:
+            _compare_executor = ComparisonExecutor()
+        return _compare_executor
@@ -1,9 +1,10 @@
-import cv2
-import mediapipe as mp
+import heapq
 import numpy as np
-from math import sqrt
-
-mp_pose = mp.solutions.pose
+from keypoint_cache import get_default_cache
+from alignment import align_frames, zip_path
+from pose_extraction import mp_pose, resample_keypoints, cache_key_for, quality_profile, DEFAULT_QUALITY
+from extraction_pool import get_extraction_pool
+import profiling
 
 # Define key joints and their weights
 JOINTS = [
@@ -19,131 +20,329 @@ JOINTS = [
     (mp_pose.PoseLandmark.LEFT_KNEE, "Left Knee", 3),
 ]
 
-def extract_keypoints(video_path, pose):
-    cap = cv2.VideoCapture(video_path)
-    keypoints = []
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success:
-            break
-
-        # Process frame for pose estimation
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = pose.process(frame_rgb)
-
-        if results.pose_landmarks:
-            keypoints.append(results.pose_landmarks.landmark)
-        else:
-            keypoints.append(None)  # No keypoints detected for this frame
-
-    cap.release()
-    return keypoints, fps
-
-def calculate_differences(keypoints1, keypoints2, joints):
-    differences = []
-    for kp1, kp2 in zip(keypoints1, keypoints2):
-        if kp1 is None or kp2 is None:
-            differences.append(None)
-            continue
-
-        vec1 = []
-        vec2 = []
-        weights = []
-
-        for joint_idx, joint_name, weight in joints:
-            x1, y1 = kp1[joint_idx].x, kp1[joint_idx].y
-            x2, y2 = kp2[joint_idx].x, kp2[joint_idx].y
-
-            vec1.extend([x1, y1])
-            vec2.extend([x2, y2])
-            weights.extend([weight, weight])  # apply weights to both x and y
-
-        # Convert to numpy arrays
-        vec1 = np.array(vec1)
-        vec2 = np.array(vec2)
-        weights = np.array(weights)
-
-        # Apply weights
-        vec1_weighted = vec1 * weights
-        vec2_weighted = vec2 * weights
-
-        # L2 normalization
-        norm1 = np.linalg.norm(vec1_weighted)
-        norm2 = np.linalg.norm(vec2_weighted)
-
-        if norm1 == 0 or norm2 == 0:
-            cosine_distance = 1  # Max distance if one vector is zero
-        else:
-            cosine_similarity = np.dot(vec1_weighted, vec2_weighted) / (norm1 * norm2)
-            cosine_distance = 1 - cosine_similarity
-
-        differences.append((cosine_distance, {}))
-
-    return differences
-
-def evaluate_video(differences, fps, thresholds):
-    evaluations = {"Excellent": 0, "Good": 0, "Fair": 0, "Poor": 0}
-    mismatches = []
-
-    for i, diff in enumerate(differences):
-        if diff is None:
-            continue  # Skip missing frames
-
-        mean_diff, joint_differences = diff
-        if mean_diff < thresholds["Good"]:
-            eval_type = "Excellent"
-        elif mean_diff < thresholds["Fair"]:
-            eval_type = "Good"
-        elif mean_diff < thresholds["Poor"]:
-            eval_type = "Fair"
-        else:
-            eval_type = "Poor"
-
-        evaluations[eval_type] += 1
-
-        # Only record mismatches (Fair and Poor)
-        if eval_type in ["Fair", "Poor"]:
-            mismatches.append({
-                "timestamp": i / fps,
-                "mean_difference": mean_diff,
-                "joint_differences": joint_differences,
-                "evaluation": eval_type
-            })
-
+# Evaluation labels in order of increasing difference
+EVALUATION_LABELS = ["Excellent", "Good", "Fair", "Poor"]
+
+# Upper bounds of the weighted cosine distance for Good, Fair and Poor; anything below Good is Excellent
+THRESHOLDS = {
+    "Good": 0.10,
+    "Fair": 0.15,
+    "Poor": 0.25
+}
+
+# Number of worst frames reported back as mismatches
+MAX_MISMATCHES = 15
+
+# Half-width of the DTW band, i.e. how far (in seconds) the student may drift from the reference
+DTW_BAND_SECONDS = 1.0
+
+# Length of the sliding window of recent student frames used to line a live stream up with the reference
+LIVE_WINDOW_SECONDS = 2.0
+
+def _joint_table(joints):
+    '''
+    Splits the JOINTS table into a landmark index array and a weight array
+    '''
+    joint_indices = np.array([int(joint_idx) for joint_idx, _, _ in joints])
+    weights = np.array([weight for _, _, weight in joints], dtype=np.float64)
+    return joint_indices, weights
+
+def pose_features(keypoints, mask, joints):
+    '''
+    Weighted (x, y) joint coordinates of every frame flattened into unit-length vectors,
+    so the dot product of two frames is their cosine similarity. Frames with no
+    detected pose are left as zero vectors.
+    '''
+    joint_indices, weights = _joint_table(joints)
+    features = (keypoints[:, joint_indices, :2].astype(np.float64) * weights[:, None]).reshape(len(keypoints), -1)
+    norms = np.linalg.norm(features, axis=1)
+    usable = mask & (norms > 0)
+    features[~usable] = 0
+    features[usable] /= norms[usable, None]
+    return features
+
+@profiling.timed("difference")
+def calculate_differences(keypoints1, mask1, keypoints2, mask2, joints, path=None):
+    '''
+    Compares two keypoint arrays at every step of an alignment path (frame i with frame i by default).
+    Returns a (steps,) array of weighted cosine distances and a (steps, joints) array of
+    per-joint distances; steps where either video has no detected pose are NaN.
+    '''
+    if path is None:
+        path = zip_path(len(keypoints1), len(keypoints2))
+    frames1, frames2 = path[:, 0], path[:, 1]
+    joint_indices, weights = _joint_table(joints)
+
+    # Gather (x, y) of every weighted joint for every aligned frame of both videos in one go
+    xy1 = keypoints1[frames1[:, None], joint_indices, :2].astype(np.float64)
+    xy2 = keypoints2[frames2[:, None], joint_indices, :2].astype(np.float64)
+
+    # Apply weights to both x and y, then flatten each frame into a single vector
+    vec1 = (xy1 * weights[:, None]).reshape(len(path), -1)
+    vec2 = (xy2 * weights[:, None]).reshape(len(path), -1)
+
+    norm1 = np.linalg.norm(vec1, axis=1)
+    norm2 = np.linalg.norm(vec2, axis=1)
+    dot = np.einsum("ij,ij->i", vec1, vec2)
+
+    # Max distance if one vector is zero
+    zero_norm = (norm1 == 0) | (norm2 == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distances = np.where(zero_norm, 1.0, 1 - dot / (norm1 * norm2))
+
+    # Per-joint euclidean distance in normalized image coordinates
+    joint_distances = np.linalg.norm(xy1 - xy2, axis=2)
+
+    missing = ~(mask1[frames1] & mask2[frames2])
+    distances[missing] = np.nan
+    joint_distances[missing] = np.nan
+
+    return distances, joint_distances
+
+def classify_distances(distances, thresholds):
+    '''
+    Index into EVALUATION_LABELS of every distance: 0 = Excellent, 1 = Good, 2 = Fair, 3 = Poor
+    '''
+    bounds = [thresholds["Good"], thresholds["Fair"], thresholds["Poor"]]
+    return np.searchsorted(bounds, distances, side="right")
+
+def _overall_evaluation(evaluations):
     # Overall evaluation based on the majority
     total_frames = sum(evaluations.values())
-    overall_evaluation = max(evaluations, key=evaluations.get) if total_frames > 0 else "No Data"
+    return max(evaluations, key=evaluations.get) if total_frames > 0 else "No Data"
 
-    # Determine matching status
-    is_matching = len(mismatches) == 0
+@profiling.timed("evaluation")
+def evaluate_video(distances, joint_distances, fps, thresholds, joints=JOINTS, path=None):
+    valid_frames = np.flatnonzero(~np.isnan(distances))  # Skip missing frames
+    valid_distances = distances[valid_frames]
 
-    return {
-        "is_matching": is_matching,
-        "overall_evaluation": overall_evaluation,
-        "evaluations": evaluations,
-        "mismatches": sorted(mismatches, key=lambda x: x["mean_difference"], reverse=True)[:15]
-    }
+    labels = classify_distances(valid_distances, thresholds)
+    counts = np.bincount(labels, minlength=len(EVALUATION_LABELS))
+    evaluations = {label: int(count) for label, count in zip(EVALUATION_LABELS, counts)}
 
-def compare_videos(video1_path, video2_path):
-    pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+    # Only record mismatches (Fair and Poor), worst first
+    mismatch_positions = np.flatnonzero(labels >= 2)
+    order = np.argsort(-valid_distances[mismatch_positions], kind="stable")
+    joint_names = [joint_name for _, joint_name, _ in joints]
 
-    keypoints1, fps1 = extract_keypoints(video1_path, pose)
-    keypoints2, fps2 = extract_keypoints(video2_path, pose)
+    mismatches = []
+    for position in mismatch_positions[order[:MAX_MISMATCHES]]:
+        step = valid_frames[position]
+        reference_frame, frame = path[step] if path is not None else (step, step)
+        mismatches.append({
+            # Time in the student (second) video, and the reference moment it was matched against
+            "timestamp": float(frame / fps),
+            "reference_timestamp": float(reference_frame / fps),
+            "mean_difference": float(distances[step]),
+            "joint_differences": dict(zip(joint_names, joint_distances[step].tolist())),
+            "evaluation": EVALUATION_LABELS[labels[position]]
+        })
 
-    differences = calculate_differences(keypoints1, keypoints2, JOINTS)
+    # Determine matching status
+    is_matching = len(mismatch_positions) == 0
 
-    thresholds = {
-        "Good": 0.10,
-        "Fair": 0.15,
-        "Poor": 0.25
+    return {
+        "is_matching": is_matching,
+        "overall_evaluation": _overall_evaluation(evaluations),
+        "evaluations": evaluations,
+        "mismatches": mismatches
     }
 
-    result = evaluate_video(differences, fps2, thresholds)
+def compare_videos(video1_path, video2_path, cache=None, alignment="zip", pool=None, progress=None, quality=DEFAULT_QUALITY):
+    if cache is None:
+        cache = get_default_cache()
+    if pool is None:
+        pool = get_extraction_pool()
+
+    # Both videos are extracted at the same time on separate worker processes
+    (keypoints1, mask1, fps1), (keypoints2, mask2, fps2) = pool.extract_many([video1_path, video2_path], cache, quality, progress=progress)
+
+    return compare_keypoints(keypoints1, mask1, fps1, keypoints2, mask2, fps2, alignment)
+
+def compare_sources(source1, source2, cache=None, alignment="zip", pool=None, quality=DEFAULT_QUALITY):
+    '''
+    Like compare_videos, but either side may already be landmarks computed by the client,
+    given as a (keypoints, mask, fps) tuple instead of a video path. Only the video sides are
+    pose-extracted on the server, with the given quality profile.
+    '''
+    _, _, target_fps = quality_profile(quality)
+    if cache is None:
+        cache = get_default_cache()
+    if pool is None:
+        pool = get_extraction_pool()
+
+    sources = [source1, source2]
+    video_sides = [i for i, source in enumerate(sources) if isinstance(source, str)]
+    extracted = pool.extract_many([sources[i] for i in video_sides], cache, quality) if video_sides else []
+    for i, result in zip(video_sides, extracted):
+        sources[i] = result
+
+    # Client landmarks may be captured at the camera's full rate; analyse them at the profile's rate
+    for i in range(len(sources)):
+        if i not in video_sides:
+            keypoints, mask, fps = sources[i]
+            analysis_fps = min(fps, target_fps)
+            sources[i] = resample_keypoints(keypoints, mask, fps, analysis_fps) + (analysis_fps,)
+
+    (keypoints1, mask1, fps1), (keypoints2, mask2, fps2) = sources
+    return compare_keypoints(keypoints1, mask1, fps1, keypoints2, mask2, fps2, alignment)
+
+def compare_keypoints(keypoints1, mask1, fps1, keypoints2, mask2, fps2, alignment="zip"):
+    '''
+    Scores the second (student) keypoint sequence against the first (reference)
+    '''
+    # Put both videos on a common timeline (only differs when one is slower than the analysis rate)
+    fps = min(fps1, fps2)
+    keypoints1, mask1 = resample_keypoints(keypoints1, mask1, fps1, fps)
+    keypoints2, mask2 = resample_keypoints(keypoints2, mask2, fps2, fps)
+
+    # Pair up reference and student frames before scoring them
+    band = int(round(DTW_BAND_SECONDS * fps))
+    with profiling.stage("alignment"):
+        path = align_frames(pose_features(keypoints1, mask1, JOINTS), pose_features(keypoints2, mask2, JOINTS), alignment, band)
+
+    distances, joint_distances = calculate_differences(keypoints1, mask1, keypoints2, mask2, JOINTS, path)
+
+    result = evaluate_video(distances, joint_distances, fps, THRESHOLDS, path=path)
 
-    pose.close()
     return result
 
+def prepare_reference(video_path, cache=None, pool=None, quality=DEFAULT_QUALITY):
+    '''
+    Extracts a reference video for live sessions and keeps its keypoints in the cache, along with
+    the quality profile they were extracted with.
+    Returns (reference_id, number of frames, fps); the id is the video's cache key.
+    '''
+    if cache is None:
+        cache = get_default_cache()
+    if pool is None:
+        pool = get_extraction_pool()
+
+    keypoints, mask, fps = pool.extract(video_path, cache, quality)
+    settings, max_dimension, target_fps = quality_profile(quality)
+    reference_id = cache_key_for(cache, video_path, settings, target_fps, max_dimension)
+    # Live sessions detect the student's frames with the same model and frame size as the reference
+    cache.put(reference_id, keypoints=keypoints, mask=mask, fps=np.float64(fps), quality=np.str_(quality))
+    return reference_id, len(keypoints), fps
+
+
+class StreamingComparator:
+    """
+    Scores a live student stream against precomputed reference keypoints, one frame at a time.
+    """
+
+    def __init__(self, reference_keypoints, reference_mask, fps, thresholds=THRESHOLDS, joints=JOINTS,
+                 window_seconds=LIVE_WINDOW_SECONDS, band_seconds=DTW_BAND_SECONDS):
+        self.reference_keypoints = reference_keypoints
+        self.reference_mask = reference_mask
+        self.reference_features = pose_features(reference_keypoints, reference_mask, joints)
+        self.fps = fps
+        self.thresholds = thresholds
+        self.joints = joints
+        self.joint_names = [joint_name for _, joint_name, _ in joints]
+
+        # Candidate offsets, smallest shift first so ties keep the student on the reference timeline
+        band = int(round(band_seconds * fps))
+        self._offsets = np.array(sorted(range(-band, band + 1), key=abs))
+        self.offset = 0
+
+        # Ring buffer of the window's pose features and the student frame each one was taken at
+        window = max(int(round(window_seconds * fps)), 1)
+        self._window_features = np.zeros((window, self.reference_features.shape[1]))
+        self._window_frames = np.zeros(window, dtype=np.int64)
+        self._window_valid = np.zeros(window, dtype=bool)
+
+        self.frames_seen = 0
+        self.counts = np.zeros(len(EVALUATION_LABELS), dtype=np.int64)
+        self._mismatches = []
+
+    def _update_offset(self):
+        '''
+        Re-align the window: pick the offset whose reference frames best match the recent student frames
+        '''
+        if not self._window_valid.any():
+            return
+        features = self._window_features[self._window_valid]
+        frames = self._window_frames[self._window_valid]
+
+        reference_frames = np.clip(frames[None, :] + self._offsets[:, None], 0, len(self.reference_features) - 1)
+        similarity = np.einsum("owd,wd->ow", self.reference_features[reference_frames], features)
+        self.offset = int(self._offsets[np.argmin((1 - similarity).mean(axis=1))])
+
+    def push(self, landmarks=None, timestamp=None):
+        '''
+        Scores one student frame. landmarks is a (NUM_LANDMARKS, LANDMARK_FIELDS) array, or None if no
+        pose was detected. timestamp is the frame's time in seconds since the session started; without
+        it frames are assumed to arrive at the reference fps.
+        '''
+        frame = int(round(timestamp * self.fps)) if timestamp is not None else self.frames_seen
+        detected = landmarks is not None
+        student_keypoints = np.zeros((1,) + self.reference_keypoints.shape[1:], dtype=np.float32)
+        if detected:
+            student_keypoints[0] = landmarks
+        student_mask = np.array([detected])
+
+        slot = self.frames_seen % len(self._window_frames)
+        self._window_features[slot] = pose_features(student_keypoints, student_mask, self.joints)[0]
+        self._window_frames[slot] = frame
+        self._window_valid[slot] = detected
+        self.frames_seen += 1
+        self._update_offset()
+
+        target = frame + self.offset
+        finished = target >= len(self.reference_keypoints)
+        reference_frame = int(np.clip(target, 0, len(self.reference_keypoints) - 1))
+
+        path = np.array([[reference_frame, 0]])
+        distances, joint_distances = calculate_differences(
+            self.reference_keypoints, self.reference_mask, student_keypoints, student_mask, self.joints, path
+        )
+
+        score = {
+            "frame": self.frames_seen - 1,
+            "timestamp": float(frame / self.fps),
+            "reference_timestamp": float(reference_frame / self.fps),
+            "difference": None,
+            "joint_differences": None,
+            "evaluation": None,
+            "finished": bool(finished)
+        }
+        if np.isnan(distances[0]):
+            return score
+
+        label = int(classify_distances(distances, self.thresholds)[0])
+        self.counts[label] += 1
+        score["difference"] = float(distances[0])
+        score["joint_differences"] = dict(zip(self.joint_names, joint_distances[0].tolist()))
+        score["evaluation"] = EVALUATION_LABELS[label]
+
+        # Keep only the worst MAX_MISMATCHES Fair and Poor frames (a min-heap on the distance)
+        if label >= 2:
+            mismatch = {key: score[key] for key in ("timestamp", "reference_timestamp", "joint_differences", "evaluation")}
+            mismatch["mean_difference"] = score["difference"]
+            entry = (score["difference"], -score["frame"], mismatch)
+            if len(self._mismatches) < MAX_MISMATCHES:
+                heapq.heappush(self._mismatches, entry)
+            else:
+                heapq.heappushpop(self._mismatches, entry)
+        return score
+
+    def summary(self):
+        '''
+        The evaluation of every frame scored so far, in the same shape as evaluate_video
+        '''
+        evaluations = {label: int(count) for label, count in zip(EVALUATION_LABELS, self.counts)}
+        worst_first = sorted(self._mismatches, key=lambda entry: (-entry[0], -entry[1]))
+        return {
+            "is_matching": int(self.counts[2:].sum()) == 0,
+            "overall_evaluation": _overall_evaluation(evaluations),
+            "evaluations": evaluations,
+            "mismatches": [
+                {key: mismatch[key] for key in ("timestamp", "reference_timestamp", "mean_difference", "joint_differences", "evaluation")}
+                for _, _, mismatch in worst_first
+            ]
+        }
+
 
 # video1_path = "sample_videos/vid1.mp4"
 # video2_path = "sample_videos/vid2.mp4"
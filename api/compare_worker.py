@@ -0,0 +1,118 @@
+import os
+import time
+import multiprocessing
+from compare_videos import compare_videos
+from extraction_pool import ExtractionPool
+from compare_jobs_crud import (
+    claim_next_compare_job, update_compare_job_progress, complete_compare_job,
+    fail_compare_job, requeue_stale_compare_jobs, CompareJobLostError,
+)
+from metrics import COMPARE_JOBS_FINISHED, COMPARE_JOB_SECONDS, COMPARE_WORKER_ERRORS, serve_metrics
+
+# Number of jobs processed at the same time, one per process
+COMPARE_WORKER_PROCESSES = int(os.environ.get("COMPARE_WORKER_PROCESSES", "2"))
+
+# Seconds to wait before polling again when the queue is empty
+POLL_INTERVAL_SECONDS = float(os.environ.get("COMPARE_POLL_INTERVAL_SECONDS", "1"))
+
+# Minimum seconds between progress writes; progress writes double as the job's heartbeat
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+# A running job with no heartbeat for this long is assumed to have lost its worker
+JOB_STALE_SECONDS = int(os.environ.get("COMPARE_JOB_STALE_SECONDS", "300"))
+
+# Times a job is retried after its worker died before it is marked as failed
+JOB_MAX_ATTEMPTS = 3
+
+# Seconds to wait after the job queue can't be reached (database restarting or still starting
+# up, pool timeout), doubled after each failure in a row up to ERROR_BACKOFF_MAX_SECONDS
+ERROR_BACKOFF_SECONDS = 1.0
+ERROR_BACKOFF_MAX_SECONDS = 60.0
+
+# Port the first worker process serves Prometheus metrics on; the next ones use the following ports. 0 turns metrics off.
+COMPARE_WORKER_METRICS_PORT = int(os.environ.get("COMPARE_WORKER_METRICS_PORT", "9100"))
+
+def _remove_files(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+def process_job(job, pool):
+    '''
+    Runs one comparison job and stores its result
+    '''
+    job_id = job["job_id"]
+    attempt = job["attempt"]
+    last_update = 0.0
+    started = time.perf_counter()
+
+    def progress(frames_processed, frames_total):
+        nonlocal last_update
+        now = time.monotonic()
+        if now - last_update >= PROGRESS_INTERVAL_SECONDS:
+            update_compare_job_progress(job_id, attempt, frames_processed, frames_total)
+            last_update = now
+
+    try:
+        result = compare_videos(job["video1_path"], job["video2_path"], alignment=job["alignment"], pool=pool, progress=progress, quality=job["quality"])
+    except CompareJobLostError:
+        stored = False
+    except Exception as e:
+        stored = fail_compare_job(job_id, attempt, f"Error processing videos: {str(e)}")
+        outcome = "failed"
+    else:
+        stored = complete_compare_job(job_id, attempt, result)
+        outcome = "done"
+    COMPARE_JOB_SECONDS.observe(time.perf_counter() - started)
+
+    if not stored:
+        # Requeued as stale (or claimed by another worker) meanwhile: whoever holds it now owns its outcome and uploads
+        print(f"Compare job {job_id} was taken over after attempt {attempt}, dropping its outcome")
+        COMPARE_JOBS_FINISHED.labels("lost").inc()
+        return
+    COMPARE_JOBS_FINISHED.labels(outcome).inc()
+
+    # Only once the outcome is stored: if storing it failed, the job is requeued when its
+    # heartbeat goes stale and needs its uploads again
+    _remove_files(job["video1_path"], job["video2_path"])
+
+def run_worker(index: int = 0):
+    '''
+    Polls the job queue forever, one job at a time
+    '''
+    if COMPARE_WORKER_METRICS_PORT > 0:
+        serve_metrics(COMPARE_WORKER_METRICS_PORT + index)
+
+    # Each worker process is one job at a time, so extraction runs inline rather than on another pool
+    pool = ExtractionPool(workers=0)
+    backoff = ERROR_BACKOFF_SECONDS
+    while True:
+        try:
+            for _, video1_path, video2_path in requeue_stale_compare_jobs(JOB_STALE_SECONDS, JOB_MAX_ATTEMPTS):
+                _remove_files(video1_path, video2_path)
+
+            job = claim_next_compare_job()
+            if job is not None:
+                process_job(job, pool)
+        except Exception as e:
+            # Keep polling: a job claimed before the failure is requeued once its heartbeat goes stale
+            print(f"Compare worker error, retrying in {backoff:g}s: {e}")
+            COMPARE_WORKER_ERRORS.inc()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, ERROR_BACKOFF_MAX_SECONDS)
+            continue
+
+        backoff = ERROR_BACKOFF_SECONDS
+        if job is None:
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+if __name__ == "__main__":
+    print(f"Starting {COMPARE_WORKER_PROCESSES} comparison worker processes...")
+    processes = [
+        multiprocessing.get_context("spawn").Process(target=run_worker, args=(index,), daemon=True)
+        for index in range(COMPARE_WORKER_PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -1,6 +1,9 @@
 import os
-from db_connect import connect
-from compare_videos import compare_videos
+from db_connect import connect, async_connect
+from timeline_crud import add_source_to_timeline, remove_source_from_timeline, HOME_TIMELINE_TABLE, TIMELINE_PULL_SOURCES_TABLE
+from search import normalize_search_query, like_pattern, search_cache, SEARCH_RESULTS_LIMIT
+from compare_videos import compare_videos, compare_sources
+from pose_extraction import DEFAULT_QUALITY
 from models import User, userLoginData, userRegisterData
 import bcrypt
 import jwt
@@ -29,6 +32,9 @@ def clear_all_tables():
         with connect() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(f"TRUNCATE TABLE {USERS_TABLE} CASCADE;")  # Clears user data -> cascades to all other tables
+                # Timelines reference users, but a pull source is only an id: a new user or club reusing it
+                # would otherwise have their posts merged in at read time and never fanned out
+                cursor.execute(f"TRUNCATE TABLE {HOME_TIMELINE_TABLE}, {TIMELINE_PULL_SOURCES_TABLE};")
                 
                 # Reset the sequence for the id column of the users table back to 1
                 cursor.execute(f"ALTER SEQUENCE {USERS_TABLE}_id_seq RESTART WITH 1;")
@@ -112,9 +118,17 @@ def get_user_by_id(user_id: int):
 # **Video Comparison Operations**
             
 # Function to compare two videos
-def compare_uploaded_videos(video1_path: str, video2_path: str):
+def compare_uploaded_videos(video1_path: str, video2_path: str, alignment: str = "zip", quality: str = DEFAULT_QUALITY):
     try:
-        result = compare_videos(video1_path, video2_path)
+        result = compare_videos(video1_path, video2_path, alignment=alignment, quality=quality)
+        return result
+    except Exception as e:
+        raise Exception(f"Error processing videos: {str(e)}")
+
+# Function to compare two sides that are each either a video path or client landmarks (keypoints, mask, fps)
+def compare_uploaded_sources(source1, source2, alignment: str = "zip", quality: str = DEFAULT_QUALITY):
+    try:
+        result = compare_sources(source1, source2, alignment=alignment, quality=quality)
         return result
     except Exception as e:
         raise Exception(f"Error processing videos: {str(e)}")
@@ -133,8 +147,7 @@ def add_follower_following(follower_id: int, following_id: int):
                 raise Exception(f"Follower user with id {follower_id} not found.")
             
             cursor.execute(f"SELECT id FROM {USERS_TABLE} WHERE id = %s", (following_id,))
-            following_id = cursor.fetchone()
-            if not following_id:
+            if cursor.fetchone() is None:
                 raise Exception(f"Following account with id {following_id} not found.")
 
             # Insert the relationship
@@ -156,6 +169,9 @@ def add_follower_following(follower_id: int, following_id: int):
                     WHERE id = %s
                 """, (follower_id,))
 
+                # Their earlier posts join the follower's home timeline
+                add_source_to_timeline(cursor, follower_id, "user", following_id)
+
             conn.commit()
 
 # Function to remove a follower following relationship
@@ -168,8 +184,7 @@ def remove_follower_following(follower_id: int, following_id: int):
                 raise Exception(f"Follower user with id {follower_id} not found.")
             
             cursor.execute(f"SELECT id FROM {USERS_TABLE} WHERE id = %s", (following_id,))
-            following_id = cursor.fetchone()
-            if not following_id:
+            if cursor.fetchone() is None:
                 raise Exception(f"Following account with id {following_id} not found.")
 
             # Insert the relationship
@@ -191,98 +206,84 @@ def remove_follower_following(follower_id: int, following_id: int):
                     WHERE id = %s
                 """, (follower_id,))
 
+                remove_source_from_timeline(cursor, follower_id, "user", following_id)
+
             conn.commit()
 
 # Function to get all accounts that a user follows
-def get_user_followings(user_id: int):
-    with connect() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT id FROM {USERS_TABLE} WHERE id = %s", (user_id,))
-            user_id = cursor.fetchone()
-            if not user_id:
-                raise Exception(f"User: {user_id} not found.")
-            
-            # Fetch all users that this user follows
-            cursor.execute(f"""
-                SELECT u.id, u.username, u.first_name, u.last_name
-                FROM {USERS_TABLE} u 
-                JOIN {USER_FOLLOWINGS_TABLE} f ON f.following_id = u.id 
-                WHERE f.user_id = %s
-            """, (user_id,))
-            followings = cursor.fetchall()
-
-            # Convert query result into a list of dictionaries
-            followings_list = [
-                {
-                    "id": user[0],
-                    "username": user[1],
-                    "first_name": user[2],
-                    "last_name": user[3]
-                }
-                for user in followings
-            ]
-            
-            return followings_list
+async def get_user_followings(user_id: int):
+    async with async_connect() as conn:
+        if await conn.fetchval(f"SELECT id FROM {USERS_TABLE} WHERE id = $1", user_id) is None:
+            raise Exception(f"User: {user_id} not found.")
+
+        # Fetch all users that this user follows
+        followings = await conn.fetch(f"""
+            SELECT u.id, u.username, u.first_name, u.last_name
+            FROM {USERS_TABLE} u 
+            JOIN {USER_FOLLOWINGS_TABLE} f ON f.following_id = u.id 
+            WHERE f.user_id = $1
+        """, user_id)
+
+        # Convert query result into a list of dictionaries
+        return [dict(user) for user in followings]
         
+# Followers of a user, with parameter user_id
+USER_FOLLOWERS_QUERY = f"""
+    SELECT u.id, u.username, u.first_name, u.last_name
+    FROM {USER_FOLLOWINGS_TABLE} f
+    JOIN {USERS_TABLE} u ON f.user_id = u.id
+    WHERE f.following_id = $1
+"""
+
 # Function to get all followers of a user
-def get_user_followers(user_id: int):
-    with connect() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT id FROM {USERS_TABLE} WHERE id = %s", (user_id,))
-            user_id = cursor.fetchone()
-            if not user_id:
-                raise Exception(f"User: {user_id} not found.")
-            
-            # Fetch all usernames that follows this user
-            cursor.execute(f"""
-                SELECT u.id, u.username, u.first_name, u.last_name
-                FROM {USER_FOLLOWINGS_TABLE} f 
-                JOIN {USERS_TABLE} u ON f.user_id = u.id 
-                WHERE f.following_id = %s
-            """, (user_id,))
-            followers = cursor.fetchall()
-
-            followers_list = [
-                {
-                    "id": user[0],
-                    "username": user[1],
-                    "first_name": user[2],
-                    "last_name": user[3]
-                }
-                for user in followers
-            ]
-            
-            return followers_list
+async def get_user_followers(user_id: int):
+    async with async_connect() as conn:
+        if await conn.fetchval(f"SELECT id FROM {USERS_TABLE} WHERE id = $1", user_id) is None:
+            raise Exception(f"User: {user_id} not found.")
+
+        # Fetch all usernames that follows this user
+        followers = await conn.fetch(USER_FOLLOWERS_QUERY, user_id)
 
-def search_users_db(query: str):
+        return [dict(user) for user in followers]
+
+# Users whose username contains a search, most similar first, with parameters like_pattern(query), query and limit
+USER_SEARCH_QUERY = f"""
+    SELECT id, username, first_name, last_name FROM {USERS_TABLE}
+    WHERE username ILIKE $1
+    ORDER BY similarity(username, $2) DESC, username
+    LIMIT $3
+"""
+
+async def search_users_db(query: str):
     """
-    Searches for users by username (partial match).
-    Returns a list of matching users.
+    Searches for users by username (partial match), most similar first.
+    Returns a list of at most SEARCH_RESULTS_LIMIT matching users.
     """
-    with connect() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                f"SELECT id, username, first_name, last_name FROM {USERS_TABLE} WHERE username ILIKE %s",
-                (f"%{query}%",)
-            )
-            users = cursor.fetchall()
+    query = normalize_search_query(query)
+    cache_key = ("users", query)
+    users = search_cache.get(cache_key)
+    if users is not None:
+        return users
 
-            if not users:
-                return []
-            
-            user_col_names = [desc[0] for desc in cursor.description]
-            return [dict(zip(user_col_names, row)) for row in users]
+    async with async_connect() as conn:
+        users = await conn.fetch(USER_SEARCH_QUERY, like_pattern(query), query, SEARCH_RESULTS_LIMIT)
+    users = [dict(user) for user in users]
+    search_cache.put(cache_key, users)
+    return users
+
+# Members of a club, with parameter club_id
+CLUB_MEMBERS_QUERY = f"""
+    SELECT u.id, u.username, u.first_name, u.last_name
+    FROM {USERS_TABLE} u
+    JOIN {MEMBERSHIPS_TABLE} mt ON mt.user_id = u.id
+    WHERE club_id = %s
+"""
 
 # Function to get all members of a club
 def get_club_members_by_id(club_id: int):
     with connect() as conn:
         with conn.cursor() as cursor:
-            cursor.execute(f"""
-                SELECT u.id, u.username, u.first_name, u.last_name
-                FROM {USERS_TABLE} u
-                JOIN {MEMBERSHIPS_TABLE} mt ON mt.user_id = u.id
-                WHERE club_id = %s
-            """, (club_id,))
+            cursor.execute(CLUB_MEMBERS_QUERY, (club_id,))
             members = cursor.fetchall()
 
             members_list = [
@@ -1,29 +1,230 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
 import psycopg2
+import asyncpg
+from psycopg2.pool import ThreadedConnectionPool
+from metrics import DB_CONNECTIONS_OPENED, DB_CONNECTION_ERRORS, DB_CONNECT_SECONDS, track_db_pool, track_async_db_pool
 
+# Connection settings, shared with the db service in docker-compose.yml
+POSTGRES_HOST = os.environ.get("POSTGRES_HOST", "db")
+POSTGRES_PORT = int(os.environ.get("POSTGRES_PORT", "5432"))
+POSTGRES_DB = os.environ.get("POSTGRES_DB", "dance_motion_db")
+POSTGRES_USER = os.environ.get("POSTGRES_USER", "brian")
+POSTGRES_PASSWORD = os.environ.get("POSTGRES_PASSWORD", "password")
+
+# Connections opened when the pool starts, and the most it will ever hold open
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+
+# Seconds to wait for a connection when all of them are borrowed
+DB_POOL_TIMEOUT_SECONDS = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "10"))
+
+# Connections idle for longer than this are pinged before being handed out again
+DB_POOL_HEALTH_CHECK_SECONDS = float(os.environ.get("DB_POOL_HEALTH_CHECK_SECONDS", "30"))
+
+
+class DatabasePoolExhaustedError(Exception):
+    pass
+
+
+class _InstrumentedConnectionPool(ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that counts the connections it opens
+    """
+
+    def _connect(self, key=None):
+        start = time.perf_counter()
+        try:
+            conn = super()._connect(key)
+        except psycopg2.Error:
+            DB_CONNECTION_ERRORS.inc()
+            raise
+        DB_CONNECTIONS_OPENED.inc()
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - start)
+        return conn
+
+
+class ConnectionPool:
+    """
+    Process-wide pool of PostgreSQL connections.
+    """
+
+    def __init__(self, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT_SECONDS, health_check_seconds: float = DB_POOL_HEALTH_CHECK_SECONDS):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_seconds = health_check_seconds
+        self._pool = _InstrumentedConnectionPool(
+            min_size, max_size,
+            host=POSTGRES_HOST,
+            port=POSTGRES_PORT,
+            dbname=POSTGRES_DB,
+            user=POSTGRES_USER,
+            password=POSTGRES_PASSWORD,
+        )
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._last_used = {}
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        with self._lock:
+            last_used = self._last_used.get(conn)
+        if last_used is None or time.monotonic() - last_used < self.health_check_seconds:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._last_used.pop(conn, None)
+        self._pool.putconn(conn, close=True)
+
+    def acquire(self):
+        '''
+        Borrows a healthy connection. Raises DatabasePoolExhaustedError if none frees up within the timeout.
+        '''
+        if not self._slots.acquire(timeout=self.timeout):
+            raise DatabasePoolExhaustedError(f"All {self.max_size} database connections are busy")
+        try:
+            # Every broken idle connection is replaced at most once, then a fresh one is opened
+            for _ in range(self.max_size + 1):
+                conn = self._pool.getconn()
+                if self._healthy(conn):
+                    return conn
+                self._discard(conn)
+            raise psycopg2.OperationalError("Could not get a working database connection")
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn):
+        '''
+        Returns a connection to the pool, rolling back anything left uncommitted
+        '''
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn)
+                return
+            with self._lock:
+                self._last_used[conn] = time.monotonic()
+            self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._pool._pool)
+            in_use = len(self._pool._used)
+        return {"max_size": self.max_size, "in_use": in_use, "idle": idle}
+
+    def close(self):
+        self._pool.closeall()
+
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    '''
+    Returns the connection pool of this process, opening it on first use
+    '''
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = ConnectionPool()
+            track_db_pool(_db_pool)
+        return _db_pool
+
+def close_db_pool():
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None:
+            _db_pool.close()
+            _db_pool = None
+
+@contextmanager
 def connect():
-    conn = None
-    print("Connecting to PostgreSQL server...")
+    '''
+    with connect() as conn: ... borrows a pooled connection for the duration of the block.
+    Like `with psycopg2_conn:`, the transaction is committed if the block succeeds and rolled back
+    if it raises; the connection then goes back to the pool rather than being closed.
+    '''
+    pool = get_db_pool()
+    conn = pool.acquire()
     try:
-        conn = psycopg2.connect(
-            host='db',
-            dbname='dance_motion_db',
-            user='brian',
-            password='password',
-            port = 5432)
-        print("Connection Successful")
-        cursor = conn.cursor()
-        cursor.execute("SELECT version()")
-        # print(cursor.fetchone())
-        return conn
-    except (Exception, psycopg2.DatabaseError) as error:
-        print(error)
-        if conn is not None:
-            conn.close()
-            print("Connection Closed")
+        yield conn
+        conn.commit()
+    finally:
+        # Rolls back whatever the block left uncommitted, e.g. after an exception
+        pool.release(conn)
 
-def close_connection(conn):
+
+# asyncpg pool for the async routes, living on the API's event loop
+_async_db_pool = None
+_async_db_pool_lock = asyncio.Lock()
+
+async def _on_async_connection(conn):
+    DB_CONNECTIONS_OPENED.inc()
+
+async def open_async_db_pool():
     '''
-    Closes a psycopg2 connection
+    Opens the asyncpg pool if it isn't open yet. Called on API startup, and again on first use
+    if the database wasn't reachable then.
     '''
-    conn.cursor().close()
-    conn.close()
\ No newline at end of file
+    global _async_db_pool
+    async with _async_db_pool_lock:
+        if _async_db_pool is None:
+            try:
+                _async_db_pool = await asyncpg.create_pool(
+                    host=POSTGRES_HOST,
+                    port=POSTGRES_PORT,
+                    database=POSTGRES_DB,
+                    user=POSTGRES_USER,
+                    password=POSTGRES_PASSWORD,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    init=_on_async_connection,
+                )
+            except (OSError, asyncpg.PostgresError):
+                DB_CONNECTION_ERRORS.inc()
+                raise
+            track_async_db_pool(_async_db_pool)
+        return _async_db_pool
+
+async def close_async_db_pool():
+    global _async_db_pool
+    async with _async_db_pool_lock:
+        if _async_db_pool is not None:
+            await _async_db_pool.close()
+            _async_db_pool = None
+
+@asynccontextmanager
+async def async_connect():
+    '''
+    async with async_connect() as conn: ... borrows an asyncpg connection for the duration of the block.
+    Unlike connect(), nothing is wrapped in a transaction: use `async with conn.transaction():` for writes.
+    '''
+    pool = _async_db_pool or await open_async_db_pool()
+    try:
+        conn = await pool.acquire(timeout=DB_POOL_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise DatabasePoolExhaustedError(f"All {DB_POOL_MAX_SIZE} async database connections are busy")
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
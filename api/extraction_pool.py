@@ -0,0 +1,230 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import profiling
+from metrics import POSE_FRAMES_PROCESSED, POSE_FRAMES_WITHOUT_POSE
+from pose_extraction import extract_segment, probe_video, cache_key_for, quality_profile, DEFAULT_QUALITY
+from pose_pool import get_pose_pool
+
+# Number of long-lived pose extraction processes. 0 runs extraction inline in the calling process.
+POSE_WORKERS = int(os.environ.get("POSE_WORKERS", os.cpu_count() or 1))
+
+# Shortest stretch of video worth handing to a worker of its own
+MIN_SEGMENT_SECONDS = float(os.environ.get("MIN_SEGMENT_SECONDS", "30"))
+
+# Lead-in run before each segment after seeking, so the tracker re-locks before frames are kept
+SEGMENT_WARMUP_SECONDS = 1.0
+
+def _init_worker(quality):
+    '''
+    Runs once in every worker process so the Pose model is loaded before the first video arrives
+    '''
+    settings, _, _ = quality_profile(quality)
+    get_pose_pool().warm(settings)
+
+def _extract_segment_in_worker(video_path, quality, start, end, warmup, profile):
+    '''
+    Returns (keypoints, mask, fps, timings); timings is None unless profile is set
+    '''
+    settings, max_dimension, target_fps = quality_profile(quality)
+    timings = {} if profile else None
+    # The pool resets tracking state on return, so each segment starts from a clean tracker
+    with get_pose_pool().pose(settings) as pose:
+        keypoints, mask, fps = extract_segment(video_path, pose, target_fps, start, end, warmup, max_dimension=max_dimension, timings=timings)
+    return keypoints, mask, fps, timings
+
+def plan_segments(frame_estimate: int, segments: int):
+    '''
+    Splits analysed frames [0, frame_estimate) into contiguous (start, end) ranges.
+    The last range is open-ended since the frame estimate may undercount.
+    '''
+    bounds = np.linspace(0, frame_estimate, segments + 1).round().astype(int)
+    ranges = [(int(bounds[i]), int(bounds[i + 1])) for i in range(segments)]
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+class ExtractionPool:
+    """
+    Process pool that runs pose extraction on several videos, or segments of one long video, at once.
+    """
+
+    def __init__(self, workers: int = POSE_WORKERS, warm_quality: str = DEFAULT_QUALITY):
+        self.workers = workers
+        self.warm_quality = warm_quality
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        if self.workers > 0:
+            self._start()
+
+    def _start(self):
+        # spawn rather than fork: MediaPipe's graph threads do not survive a fork
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.warm_quality,),
+        )
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            try:
+                future = self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM on a huge upload); replace the pool rather than failing forever
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._start()
+                future = self._executor.submit(fn, *args)
+            self._in_flight += 1
+
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _segment_count(self, fps, frame_estimate, videos_in_flight):
+        '''
+        Long videos are split so that every worker has something to do
+        '''
+        by_length = int(frame_estimate / fps // MIN_SEGMENT_SECONDS)
+        by_workers = self.workers // videos_in_flight
+        return max(min(by_length, by_workers), 1)
+
+    def _submit_segments(self, video_path, quality, fps, frame_estimate, segments, profile):
+        warmup = int(round(SEGMENT_WARMUP_SECONDS * fps))
+        return [
+            self._submit(_extract_segment_in_worker, video_path, quality, start, end, warmup if start > 0 else 0, profile)
+            for start, end in plan_segments(frame_estimate, segments)
+        ]
+
+    def extract_many(self, video_paths, cache=None, quality=DEFAULT_QUALITY, segments=None, progress=None):
+        '''
+        Extracts several videos concurrently with the given quality profile, returning (keypoints, mask, fps)
+        for each in the order of video_paths. Each video is split into `segments` time ranges processed by separate workers and
+        stitched back together; by default long videos are split so that all workers are kept busy.
+        '''
+        with profiling.stage("extraction"):
+            return self._extract_many(video_paths, cache, quality, segments, progress)
+
+    def _extract_many(self, video_paths, cache, quality, segments, progress):
+        settings, max_dimension, target_fps = quality_profile(quality)
+        trace = profiling.current_trace()
+        timings = [{} if trace is not None else None for _ in video_paths]
+        results = [None] * len(video_paths)
+        cache_keys = [None] * len(video_paths)
+        probes = {}
+        for i, video_path in enumerate(video_paths):
+            if cache is not None:
+                cache_keys[i] = cache_key_for(cache, video_path, settings, target_fps, max_dimension)
+                entry = cache.get(cache_keys[i])
+                if entry is not None:
+                    results[i] = (entry["keypoints"], entry["mask"], float(entry["fps"]))
+                    continue
+            probes[i] = probe_video(video_path, target_fps)
+
+        # Cached videos count as already processed
+        frames_done = sum(len(result[0]) for result in results if result is not None)
+        frames_total = frames_done + sum(frame_estimate for _, frame_estimate in probes.values())
+
+        def report(frames):
+            if progress is not None:
+                # The frame estimate can be off by a few frames; never report more than 100%
+                progress(min(frames, frames_total), frames_total)
+
+        pending = {}
+        for i, (fps, frame_estimate) in probes.items():
+            if self._executor is None:
+                done_before = frames_done
+                results[i] = self._extract_inline(video_paths[i], quality, lambda n: report(done_before + n), timings[i])
+                frames_done += len(results[i][0])
+            else:
+                segment_count = segments or self._segment_count(fps, frame_estimate, len(video_paths))
+                pending[i] = self._submit_segments(video_paths[i], quality, fps, frame_estimate, segment_count, trace is not None)
+
+        for i, futures in pending.items():
+            parts = []
+            for future in futures:
+                parts.append(future.result())
+                frames_done += len(parts[-1][0])
+                report(frames_done)
+                # Segments ran in parallel, so these add up to more than the wall time
+                for key, seconds in (parts[-1][3] or {}).items():
+                    timings[i][key] = timings[i].get(key, 0.0) + seconds
+            keypoints = np.concatenate([part[0] for part in parts])
+            mask = np.concatenate([part[1] for part in parts])
+            results[i] = (keypoints, mask, parts[0][2])
+
+        for i in probes:
+            keypoints, mask, fps = results[i]
+            POSE_FRAMES_PROCESSED.labels(quality).inc(len(keypoints))
+            POSE_FRAMES_WITHOUT_POSE.labels(quality).inc(int(len(mask) - mask.sum()))
+            if cache is not None:
+                cache.put(cache_keys[i], keypoints=keypoints, mask=mask, fps=np.float64(fps))
+
+        if trace is not None:
+            for i, (keypoints, mask, _) in enumerate(results):
+                video_timings = timings[i]
+                trace.add_video(
+                    f"video{i + 1}", len(keypoints), int(len(mask) - mask.sum()), i not in probes,
+                    video_timings.get("decode_seconds", 0.0), video_timings.get("inference_seconds", 0.0)
+                )
+                frames_extracted = len(keypoints) if i in probes else 0
+                trace.add("decode", video_timings.get("decode_seconds", 0.0), calls=frames_extracted)
+                trace.add("inference", video_timings.get("inference_seconds", 0.0), calls=frames_extracted)
+
+        report(frames_total)
+        return results
+
+    def extract(self, video_path: str, cache=None, quality=DEFAULT_QUALITY, segments=None, progress=None):
+        return self.extract_many([video_path], cache, quality, segments, progress)[0]
+
+    def _extract_inline(self, video_path, quality, progress=None, timings=None):
+        settings, max_dimension, target_fps = quality_profile(quality)
+        with get_pose_pool().pose(settings) as pose:
+            return extract_segment(video_path, pose, target_fps, progress=progress, max_dimension=max_dimension, timings=timings)
+
+    def stats(self):
+        '''
+        Worker processes and how many of them are busy. Each worker holds one warm Pose model,
+        so this is also the utilization of the worker-side pose models.
+        '''
+        with self._lock:
+            busy = min(self._in_flight, self.workers)
+            return {
+                "workers": self.workers,
+                "busy": busy,
+                "queued": self._in_flight - busy,
+                "utilization": busy / self.workers if self.workers else 0.0,
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+def get_extraction_pool():
+    '''
+    Returns the process-wide extraction pool, shared by every request
+    '''
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ExtractionPool()
+        return _extraction_pool
+
+def shutdown_extraction_pool():
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is not None:
+            _extraction_pool.shutdown()
+            _extraction_pool = None
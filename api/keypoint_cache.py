@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: fall back to best-effort eviction without a lock
+    fcntl = None
+
+# Bump this whenever the layout of the cached arrays changes so stale entries are never read
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.environ.get("KEYPOINT_CACHE_DIR", "/tmp/keypoint_cache")
+DEFAULT_CACHE_MAX_MB = int(os.environ.get("KEYPOINT_CACHE_MAX_MB", "512"))
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class KeypointCache:
+    """
+    Content-addressed on-disk store for extracted pose keypoints.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, video_path: str, settings: dict):
+        '''
+        Build the cache key for a video file and the settings used to extract it
+        '''
+        digest = hashlib.sha256()
+        with open(video_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+
+        settings_blob = json.dumps({"version": CACHE_FORMAT_VERSION, **settings}, sort_keys=True)
+        digest.update(settings_blob.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key: str):
+        '''
+        Returns the cached arrays for key as a dict, or None on a miss
+        '''
+        path = self._entry_path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = {name: data[name] for name in data.files}
+        except (FileNotFoundError, OSError, ValueError, EOFError, zipfile.BadZipFile):
+            # Missing, evicted by another process mid-read, or a truncated file
+            return None
+
+        # Refresh the access time so eviction keeps hot entries around
+        try:
+            os.utime(path, None)
+        except OSError:
+            # Evicted since it was read; the arrays are already in hand
+            pass
+        return entry
+
+    def put(self, key: str, **arrays):
+        '''
+        Atomically store the given arrays under key, then enforce the size bound
+        '''
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self._entry_path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self):
+        '''
+        Remove least recently used entries until the cache fits in max_bytes
+        '''
+        lock_path = os.path.join(self.cache_dir, ".evict.lock")
+        with open(lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            entries = []
+            total_bytes = 0
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(".npz"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total_bytes += stat.st_size
+
+            # Oldest access first
+            entries.sort()
+            for _, size, path in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total_bytes -= size
+                except FileNotFoundError:
+                    pass
+
+
+_default_cache = None
+
+def get_default_cache():
+    '''
+    Returns the process-wide keypoint cache configured from the environment
+    '''
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = KeypointCache()
+    return _default_cache
@@ -0,0 +1,63 @@
+import struct
+import numpy as np
+from pose_extraction import NUM_LANDMARKS, LANDMARK_FIELDS
+
+LANDMARK_MAGIC = b"DMLM"
+LANDMARK_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHfIHH")
+
+# Highest frame rate accepted from a client; anything above is almost certainly a bad header
+MAX_LANDMARK_FPS = 240.0
+
+
+class LandmarkFormatError(ValueError):
+    pass
+
+
+def encode_landmarks(keypoints, mask, fps):
+    '''
+    Packs a (frames, NUM_LANDMARKS, LANDMARK_FIELDS) keypoint array, its mask and fps into the binary format
+    '''
+    keypoints = np.asarray(keypoints)
+    mask = np.asarray(mask, dtype=bool)
+    frames, landmarks, fields = keypoints.shape
+    header = _HEADER.pack(LANDMARK_MAGIC, LANDMARK_FORMAT_VERSION, 0, fps, frames, landmarks, fields)
+    data = np.where(mask[:, None, None], keypoints, 0).astype("<f2")
+    return header + np.packbits(mask).tobytes() + data.tobytes()
+
+
+def decode_landmarks(blob: bytes):
+    '''
+    Unpacks the binary format into (keypoints, mask, fps), with keypoints as float32 like server-side
+    extraction produces. Raises LandmarkFormatError if the data is malformed or of an unknown version.
+    '''
+    if len(blob) < _HEADER.size:
+        raise LandmarkFormatError("Landmark data is too short")
+    magic, version, _, fps, frames, landmarks, fields = _HEADER.unpack_from(blob)
+
+    if magic != LANDMARK_MAGIC:
+        raise LandmarkFormatError("Not landmark data")
+    if version != LANDMARK_FORMAT_VERSION:
+        raise LandmarkFormatError(f"Unsupported landmark format version {version}")
+    if (landmarks, fields) != (NUM_LANDMARKS, LANDMARK_FIELDS):
+        raise LandmarkFormatError(f"Expected {NUM_LANDMARKS} landmarks of {LANDMARK_FIELDS} fields")
+    if not 0 < fps <= MAX_LANDMARK_FPS:
+        raise LandmarkFormatError(f"fps must be between 0 and {MAX_LANDMARK_FPS:g}")
+    if frames == 0:
+        raise LandmarkFormatError("Landmark data has no frames")
+
+    mask_size = (frames + 7) // 8
+    data_size = frames * landmarks * fields * 2
+    if len(blob) != _HEADER.size + mask_size + data_size:
+        raise LandmarkFormatError("Landmark data length does not match its header")
+
+    mask = np.unpackbits(np.frombuffer(blob, dtype=np.uint8, count=mask_size, offset=_HEADER.size))[:frames].astype(bool)
+    keypoints = np.frombuffer(blob, dtype="<f2", offset=_HEADER.size + mask_size)
+    keypoints = keypoints.reshape(frames, landmarks, fields).astype(np.float32)
+
+    keypoints[~mask] = 0
+    if not np.isfinite(keypoints).all():
+        raise LandmarkFormatError("Landmark data contains non-finite coordinates")
+
+    return keypoints, mask, float(fps)
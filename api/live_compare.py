@@ -0,0 +1,190 @@
+import os
+import json
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+import cv2
+import numpy as np
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from compare_videos import StreamingComparator
+from pose_extraction import NUM_LANDMARKS, LANDMARK_FIELDS, DEFAULT_QUALITY, quality_profile, downscale_frame
+from pose_pool import get_pose_pool, PosePoolExhaustedError, POSE_POOL_SIZE
+
+# Frames waiting to be scored. When the client sends faster than frames can be scored the oldest
+# are dropped, so the latency of a score never grows beyond this many frames.
+LIVE_MAX_PENDING_FRAMES = int(os.environ.get("LIVE_MAX_PENDING_FRAMES", "2"))
+
+# Sessions sending camera frames hold a pose model for their whole length. At most this many do at
+# once per process, so the rest of the pose pool stays free for inline /compare extraction.
+LIVE_MAX_POSE_SESSIONS = int(os.environ.get("LIVE_MAX_POSE_SESSIONS", str(max(POSE_POOL_SIZE // 2, 1))))
+
+_live_pose_slots = threading.BoundedSemaphore(LIVE_MAX_POSE_SESSIONS)
+
+
+def acquire_live_pose(settings: dict):
+    '''
+    Checks out a pose model for a live session without waiting.
+    Raises PosePoolExhaustedError if live sessions or the pose pool are at capacity.
+    '''
+    if not _live_pose_slots.acquire(blocking=False):
+        raise PosePoolExhaustedError(f"All {LIVE_MAX_POSE_SESSIONS} live sessions with server-side pose detection are in use")
+    try:
+        return get_pose_pool().acquire(settings, timeout=0)
+    except Exception:
+        _live_pose_slots.release()
+        raise
+
+
+def release_live_pose(pose, settings: dict):
+    get_pose_pool().release(pose, settings)
+    _live_pose_slots.release()
+
+
+def parse_landmarks(landmarks):
+    '''
+    Validates client-side landmarks, returning a (NUM_LANDMARKS, LANDMARK_FIELDS) array or None
+    '''
+    if landmarks is None:
+        return None
+    array = np.asarray(landmarks, dtype=np.float32)
+    if array.shape != (NUM_LANDMARKS, LANDMARK_FIELDS):
+        raise ValueError(f"landmarks must be {NUM_LANDMARKS} rows of [x, y, z, visibility]")
+    if not np.isfinite(array).all():
+        raise ValueError("landmarks must be finite numbers")
+    return array
+
+
+def parse_timestamp(timestamp, arrival_time: float):
+    '''
+    Validates a client-side capture time in seconds since the session started; frames without one
+    are placed at the time they arrived
+    '''
+    if timestamp is None:
+        return arrival_time
+    if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)) or not math.isfinite(timestamp) or timestamp < 0:
+        raise ValueError("timestamp must be a non-negative number of seconds")
+    return float(timestamp)
+
+
+def _is_end_message(text: str):
+    try:
+        message = json.loads(text)
+    except ValueError:
+        # Malformed frames are reported by the scoring loop, not here
+        return False
+    return isinstance(message, dict) and bool(message.get("end"))
+
+
+class LiveSession:
+    """
+    One WebSocket connection: a receiver task queues incoming frames while the scoring loop
+    works through them in order, dropping stale frames if it falls behind.
+    """
+
+    def __init__(self, websocket: WebSocket, comparator: StreamingComparator, quality: str = DEFAULT_QUALITY):
+        self.websocket = websocket
+        self.comparator = comparator
+        # Camera frames are detected with the model and frame size the reference was extracted with
+        self.settings, self.max_dimension, _ = quality_profile(quality)
+        self._pending = deque()
+        # Arrival time of the first frame, the start of the session's timeline
+        self._started = None
+        self._arrived = asyncio.Event()
+        self._ended = False
+        self._disconnected = False
+        self.dropped = 0
+        self._pose = None
+
+    async def _receive(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    self._disconnected = True
+                    break
+                if message.get("text") is not None and _is_end_message(message["text"]):
+                    break
+                arrived = time.monotonic()
+                if self._started is None:
+                    self._started = arrived
+                if len(self._pending) >= LIVE_MAX_PENDING_FRAMES:
+                    self._pending.popleft()
+                    self.dropped += 1
+                self._pending.append((message, arrived - self._started))
+                self._arrived.set()
+        except WebSocketDisconnect:
+            self._disconnected = True
+        finally:
+            self._ended = True
+            self._arrived.set()
+
+    def _detect(self, data: bytes):
+        '''
+        Runs pose detection on an encoded camera frame; returns landmarks or None
+        '''
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Could not decode frame")
+        image = downscale_frame(image, self.max_dimension)
+        if self._pose is None:
+            # Held for the whole session so the tracker follows the student between frames
+            self._pose = acquire_live_pose(self.settings)
+        results = self._pose.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if not results.pose_landmarks:
+            return None
+        return np.array(
+            [[lm.x, lm.y, lm.z, lm.visibility] for lm in results.pose_landmarks.landmark],
+            dtype=np.float32
+        )
+
+    async def _score(self, message, arrival_time):
+        if message.get("bytes") is not None:
+            landmarks = await run_in_threadpool(self._detect, message["bytes"])
+            # Camera frames carry no capture time, and cameras rarely run at the reference's fps:
+            # place each frame on the reference timeline by when it arrived
+            timestamp = arrival_time
+        else:
+            frame = json.loads(message["text"])
+            landmarks = parse_landmarks(frame.get("landmarks"))
+            timestamp = parse_timestamp(frame.get("timestamp"), arrival_time)
+        return self.comparator.push(landmarks, timestamp)
+
+    async def run(self):
+        await self.websocket.send_json({
+            "type": "ready",
+            "fps": self.comparator.fps,
+            "frames": len(self.comparator.reference_keypoints)
+        })
+
+        receiver = asyncio.create_task(self._receive())
+        try:
+            while True:
+                await self._arrived.wait()
+                self._arrived.clear()
+                while self._pending and not self._disconnected:
+                    try:
+                        score = await self._score(*self._pending.popleft())
+                    except PosePoolExhaustedError as e:
+                        # No model free for this session: turn it away now rather than on every frame
+                        await self.websocket.send_json({"type": "error", "detail": str(e)})
+                        await self.websocket.close(code=1013)
+                        return
+                    except (ValueError, TypeError, AttributeError) as e:
+                        await self.websocket.send_json({"type": "error", "detail": str(e)})
+                        continue
+                    await self.websocket.send_json({"type": "score", "dropped": self.dropped, **score})
+                if self._ended:
+                    break
+
+            if not self._disconnected:
+                await self.websocket.send_json({"type": "summary", **self.comparator.summary()})
+                await self.websocket.close()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+            if self._pose is not None:
+                release_live_pose(self._pose, self.settings)
@@ -1,14 +1,32 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, UploadFile, Form, Body, Request
+from fastapi import FastAPI, File, UploadFile, HTTPException, UploadFile, Form, Body, Request, WebSocket
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 import boto3
-from db_connect import connect
+import asyncio
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from db_connect import close_db_pool, open_async_db_pool, close_async_db_pool
+from migrate import apply_migrations_when_ready
 from crud import *
 from models import *
 import os
 from posts_event_crud import *
 from clubs_crud import *
+from compare_jobs_crud import create_compare_job, get_compare_job, JOB_DONE, JOB_FAILED
+from alignment import ALIGNMENT_MODES
+from pose_extraction import QUALITY_PROFILES, DEFAULT_QUALITY
+from extraction_pool import get_extraction_pool, shutdown_extraction_pool
+from compare_queue import get_compare_executor, QueueFullError, COMPARE_RETRY_AFTER_SECONDS
+from uploads import save_upload, read_upload, UploadTooLargeError
+from landmark_format import decode_landmarks, LandmarkFormatError
+from keypoint_cache import get_default_cache
+from compare_videos import prepare_reference, StreamingComparator
+from live_compare import LiveSession
+from pose_pool import get_pose_pool
+import profiling
+import time
+from metrics import MetricsMiddleware, S3_UPLOAD_BYTES, S3_UPLOAD_SECONDS, track_compare_executor, track_extraction_pool, latest
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -23,11 +41,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Request latency per route, served with everything else at /metrics
+app.add_middleware(MetricsMiddleware)
+
 UPLOAD_FOLDER = "/tmp"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Uploads for queued comparison jobs; must be shared with the compare_worker processes
+COMPARE_JOB_FOLDER = os.environ.get("COMPARE_JOB_FOLDER", "/tmp/compare_jobs")
+os.makedirs(COMPARE_JOB_FOLDER, exist_ok=True)
+
 AWS_ACCESS_KEY = ""
 AWS_SECRET_KEY = ""
 S3_BUCKET_NAME = "fydp25stravadance"
@@ -39,6 +65,42 @@ s3_client = boto3.client(
     region_name='us-east-2'
 )
 
+@app.on_event("startup")
+def run_migrations():
+    # Bring the schema up to date before serving. Raising here stops the API from starting, since the
+    # CRUD modules rely on the migrated schema
+    apply_migrations_when_ready()
+
+@app.on_event("startup")
+def start_extraction_pool():
+    # Start the pose workers up front so the first comparison doesn't pay for loading models
+    track_extraction_pool(get_extraction_pool())
+    track_compare_executor(get_compare_executor())
+
+@app.on_event("startup")
+async def start_database_pool():
+    # The async routes share one asyncpg pool. If the database isn't up yet, it opens on first use instead
+    try:
+        await open_async_db_pool()
+    except Exception as e:
+        print(f"Could not open the database pool: {e}")
+
+@app.on_event("shutdown")
+async def stop_database_pool():
+    await close_async_db_pool()
+
+@app.on_event("shutdown")
+def stop_extraction_pool():
+    shutdown_extraction_pool()
+    get_pose_pool().close()
+    close_db_pool()
+
+# Prometheus metrics
+@app.get("/metrics")
+def get_metrics():
+    body, content_type = latest()
+    return Response(content=body, media_type=content_type)
+
 @app.delete("/reset")
 def clear_all_data():
     """
@@ -50,47 +112,298 @@ def clear_all_data():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing tables: {str(e)}")
 
+def _remove_files(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _profiled(endpoint, debug, fn, *args):
+    """
+    Runs fn(*args), traced if debug is set (or PROFILE_ALL_REQUESTS), adding the per-stage
+    timings to the result when the client asked for them.
+    """
+    with profiling.trace(debug or profiling.PROFILE_ALL_REQUESTS, endpoint=endpoint) as trace:
+        result = fn(*args)
+    if debug:
+        result["timings"] = trace.to_dict()
+    return result
+
+def _compare_and_cleanup(video1_path, video2_path, alignment, quality, debug=False):
+    """
+    Runs a comparison on the comparison executor and removes the uploaded files afterwards.
+    Cleanup happens here rather than in the endpoint so the files outlive a client disconnect.
+    """
+    try:
+        return _profiled("/compare", debug, compare_uploaded_videos, video1_path, video2_path, alignment, quality)
+    finally:
+        _remove_files(video1_path, video2_path)
+
+def _queue_full_response():
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(COMPARE_RETRY_AFTER_SECONDS)},
+        content={"success": False, "error": "Too many comparisons in progress, please retry later."}
+    )
+
 # Video Comparison Endpoint
 @app.post("/compare")
-async def compare_endpoint(video1: UploadFile = File(...), video2: UploadFile = File(...)):
+async def compare_endpoint(
+    video1: UploadFile = File(...), video2: UploadFile = File(...),
+    alignment: str = Form("zip"), quality: str = Form(DEFAULT_QUALITY), debug: bool = Form(False)
+):
     """
     Endpoint to compare two uploaded videos.
     """
-    # Save uploaded files
-    video1_path = os.path.join(UPLOAD_FOLDER, video1.filename)
-    video2_path = os.path.join(UPLOAD_FOLDER, video2.filename)
-
+    if alignment not in ALIGNMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"alignment must be one of: {', '.join(ALIGNMENT_MODES)}")
+    if quality not in QUALITY_PROFILES:
+        raise HTTPException(status_code=400, detail=f"quality must be one of: {', '.join(QUALITY_PROFILES)}")
+
+    # Reject early, before spending time writing the uploads to disk
+    executor = get_compare_executor()
+    if executor.is_full():
+        return _queue_full_response()
+
+    # Stream the uploads to disk in chunks rather than reading them into memory
+    video_paths = []
     try:
-        with open(video1_path, "wb") as f:
-            f.write(await video1.read())
-        with open(video2_path, "wb") as f:
-            f.write(await video2.read())
+        for video in (video1, video2):
+            video_paths.append(await save_upload(video, UPLOAD_FOLDER))
+
+        # Run the CPU-bound comparison off the event loop so other requests keep being served
+        future = executor.submit(_compare_and_cleanup, video_paths[0], video_paths[1], alignment, quality, debug)
+    except UploadTooLargeError as e:
+        _remove_files(*video_paths)
+        raise HTTPException(status_code=413, detail=str(e))
+    except QueueFullError:
+        _remove_files(*video_paths)
+        return _queue_full_response()
+    except Exception as e:
+        _remove_files(*video_paths)
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "error": str(e)}
+        )
 
-        # Call the function to compare videos
-        result = compare_uploaded_videos(video1_path, video2_path)
+    try:
+        result = await asyncio.wrap_future(future)
     except Exception as e:
         error_message = str(e)
         return JSONResponse(
             status_code=500,
             content={"success": False, "error": error_message}
         )
+
+    return JSONResponse(content=result)
+
+def _compare_sources_and_cleanup(source1, source2, alignment, quality, debug=False):
+    try:
+        return _profiled("/compare/landmarks", debug, compare_uploaded_sources, source1, source2, alignment, quality)
     finally:
-        # Clean up uploaded files
-        if os.path.exists(video1_path):
-            os.remove(video1_path)
-        if os.path.exists(video2_path):
-            os.remove(video2_path)
+        _remove_files(*[source for source in (source1, source2) if isinstance(source, str)])
+
+# Compare with landmarks computed on the client
+@app.post("/compare/landmarks")
+async def compare_landmarks_endpoint(
+    video1: Optional[UploadFile] = File(None), landmarks1: Optional[UploadFile] = File(None),
+    video2: Optional[UploadFile] = File(None), landmarks2: Optional[UploadFile] = File(None),
+    alignment: str = Form("zip"), quality: str = Form(DEFAULT_QUALITY), debug: bool = Form(False)
+):
+    """
+    Same as /compare, but each side is either a video or landmarks in the binary format of
+    landmark_format.py. Sides sent as landmarks skip pose inference on the server.
+    """
+    if alignment not in ALIGNMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"alignment must be one of: {', '.join(ALIGNMENT_MODES)}")
+    if quality not in QUALITY_PROFILES:
+        raise HTTPException(status_code=400, detail=f"quality must be one of: {', '.join(QUALITY_PROFILES)}")
+    sides = [(video1, landmarks1), (video2, landmarks2)]
+    for i, (video, landmarks) in enumerate(sides, start=1):
+        if (video is None) == (landmarks is None):
+            raise HTTPException(status_code=400, detail=f"Send exactly one of video{i} or landmarks{i}.")
+
+    executor = get_compare_executor()
+    if executor.is_full():
+        return _queue_full_response()
+
+    sources = []
+    try:
+        for video, landmarks in sides:
+            if landmarks is not None:
+                sources.append(decode_landmarks(await read_upload(landmarks)))
+            else:
+                sources.append(await save_upload(video, UPLOAD_FOLDER))
+
+        future = executor.submit(_compare_sources_and_cleanup, sources[0], sources[1], alignment, quality, debug)
+    except LandmarkFormatError as e:
+        _remove_files(*[source for source in sources if isinstance(source, str)])
+        raise HTTPException(status_code=400, detail=str(e))
+    except UploadTooLargeError as e:
+        _remove_files(*[source for source in sources if isinstance(source, str)])
+        raise HTTPException(status_code=413, detail=str(e))
+    except QueueFullError:
+        _remove_files(*[source for source in sources if isinstance(source, str)])
+        return _queue_full_response()
+
+    try:
+        result = await asyncio.wrap_future(future)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "error": str(e)}
+        )
 
     return JSONResponse(content=result)
 
+# Comparison queue depth
+@app.get("/compare/queue")
+def compare_queue_status():
+    return get_compare_executor().stats()
+
+# Pose model pool size and utilization
+@app.get("/compare/pose-pool")
+def pose_pool_status():
+    return {
+        # Extraction worker processes, one warm model each
+        "workers": get_extraction_pool().stats(),
+        # Models held by this process (inline extraction and live sessions)
+        "local": get_pose_pool().stats(),
+    }
+
+# Queue a comparison to be processed in the background
+@app.post("/compare/jobs", status_code=202)
+async def submit_compare_job(
+    video1: UploadFile = File(...), video2: UploadFile = File(...),
+    alignment: str = Form("zip"), quality: str = Form(DEFAULT_QUALITY)
+):
+    """
+    Saves both videos and queues a comparison job. Returns immediately with the job id.
+    """
+    if alignment not in ALIGNMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"alignment must be one of: {', '.join(ALIGNMENT_MODES)}")
+    if quality not in QUALITY_PROFILES:
+        raise HTTPException(status_code=400, detail=f"quality must be one of: {', '.join(QUALITY_PROFILES)}")
+
+    video_paths = []
+    try:
+        for video in (video1, video2):
+            video_paths.append(await save_upload(video, COMPARE_JOB_FOLDER))
+
+        job_id = await run_in_threadpool(create_compare_job, video_paths[0], video_paths[1], alignment, quality)
+    except UploadTooLargeError as e:
+        _remove_files(*video_paths)
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        _remove_files(*video_paths)
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "error": str(e)}
+        )
+
+    return {"job_id": job_id, "status": "queued"}
+
+# Get the status and progress of a comparison job
+@app.get("/compare/jobs/{job_id}")
+def get_compare_job_status(job_id: int):
+    try:
+        job = get_compare_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "frames_processed": job["frames_processed"],
+        "frames_total": job["frames_total"],
+        "error": job["error"],
+    }
+
+# Get the result of a finished comparison job
+@app.get("/compare/jobs/{job_id}/result")
+def get_compare_job_result(job_id: int):
+    try:
+        job = get_compare_job(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    if job["status"] == JOB_FAILED:
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "error": job["error"]}
+        )
+    if job["status"] != JOB_DONE:
+        raise HTTPException(status_code=409, detail=f"Comparison job {job_id} is still {job['status']}.")
+
+    return JSONResponse(content=job["result"])
+
+def _prepare_reference_and_cleanup(video_path, quality):
+    try:
+        return prepare_reference(video_path, quality=quality)
+    finally:
+        _remove_files(video_path)
+
+# Upload a reference video for live practice sessions
+@app.post("/compare/references")
+async def create_compare_reference(video: UploadFile = File(...), quality: str = Form(DEFAULT_QUALITY)):
+    """
+    Extracts the reference video's keypoints once, ahead of any live session.
+    Returns the reference_id to open /compare/live/{reference_id} with.
+    """
+    if quality not in QUALITY_PROFILES:
+        raise HTTPException(status_code=400, detail=f"quality must be one of: {', '.join(QUALITY_PROFILES)}")
+
+    executor = get_compare_executor()
+    if executor.is_full():
+        return _queue_full_response()
+
+    video_path = None
+    try:
+        video_path = await save_upload(video, UPLOAD_FOLDER)
+        future = executor.submit(_prepare_reference_and_cleanup, video_path, quality)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except QueueFullError:
+        _remove_files(video_path)
+        return _queue_full_response()
+
+    try:
+        reference_id, frames, fps = await asyncio.wrap_future(future)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"success": False, "error": str(e)}
+        )
+
+    return {"reference_id": reference_id, "frames": frames, "fps": fps}
+
+# Live practice: score student frames against a reference as they are captured
+@app.websocket("/compare/live/{reference_id}")
+async def live_compare(websocket: WebSocket, reference_id: str):
+    # Reference ids are cache keys (hex digests); anything else can't be one
+    reference = None
+    if reference_id.isalnum():
+        reference = await run_in_threadpool(get_default_cache().get, reference_id)
+    if reference is None or "quality" not in reference:
+        # Unknown, evicted from the keypoint cache, or not uploaded through /compare/references (so its
+        # quality profile isn't known): the client needs to upload the reference again
+        await websocket.close(code=1008, reason="Unknown reference_id, upload the reference video again.")
+        return
+
+    await websocket.accept()
+    comparator = StreamingComparator(reference["keypoints"], reference["mask"], float(reference["fps"]))
+    await LiveSession(websocket, comparator, str(reference["quality"])).run()
+
 #Fetch POsts
 # TODO: this needs to be changed to GET! But the params into query parameters
 @app.post("/posts")
 #clubs fetch
-def get_posts(request_body: postsUserRequest):
+async def get_posts(request_body: postsFeedRequest, response: Response):
     try:
-        response = fetch_posts(request_body)
-        return response
+        posts, next_cursor = await fetch_posts(request_body)
+        # The body stays a plain list of posts; the cursor of the next page travels in a header
+        if next_cursor is not None:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return posts
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
@@ -113,12 +426,15 @@ async def upload_post(files: list[UploadFile] = File(...),
 
         for file in files:
             # Upload each file to S3
+            start = time.perf_counter()
             s3_client.upload_fileobj(
                 file.file,
                 S3_BUCKET_NAME,
                 f"user_post/{post_id}-{file.filename}",
-                ExtraArgs={"ContentType": file.content_type}
+                ExtraArgs={"ContentType": file.content_type},
+                Callback=S3_UPLOAD_BYTES.inc
             )
+            S3_UPLOAD_SECONDS.observe(time.perf_counter() - start)
         
         return {"message": "Post uploaded successfully"}
     except Exception as e:
@@ -170,10 +486,10 @@ def register(request_body: userRegisterData):
 # Get all events applicable to a user based off the clubs they follow
 # TODO: change this to a get later...
 @app.post("/user/events")
-def get_user_club_events(request_body: postsUserRequest):
+async def get_user_club_events(request_body: postsUserRequest):
     # TODO: somehow get rid of the user_id here...?
     try:
-        events = get_events_by_user_id(request_body)
+        events = await get_events_by_user_id(request_body)
         return {"events": events}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error fetching club events: {str(e)}")
@@ -210,18 +526,18 @@ def remove_following(unfollow_request: userFollowRequest):
     
 # Get all accounts that a user follows
 @app.get("/followings/{user_id}")
-def get_followings(user_id: int):
+async def get_followings(user_id: int):
     try:
-        followings = get_user_followings(user_id)
+        followings = await get_user_followings(user_id)
         return {"followings": followings}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error fetching user followings: {str(e)}")
     
 # Get all accounts that follows a user
 @app.get("/followers/{user_id}")
-def get_followers(user_id: int):
+async def get_followers(user_id: int):
     try:
-        followers = get_user_followers(user_id)
+        followers = await get_user_followers(user_id)
         return {"followers": followers}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error fetching user followers: {str(e)}")
@@ -292,11 +608,14 @@ def get_user_clubs(user_id: int):
         raise HTTPException(status_code=400, detail=f"Error fetching user clubs: {str(e)}")
 
 @app.get("/search/clubs")
-def search_clubs(query: str):
+async def search_clubs(query: str):
     """
     API endpoint to search for clubs.
     """
-    clubs = search_clubs_db(query)
+    try:
+        clubs = await search_clubs_db(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     if not clubs:
         return JSONResponse(
@@ -311,11 +630,14 @@ def search_clubs(query: str):
 
 
 @app.get("/search/users")
-def search_users(query: str):
+async def search_users(query: str):
     """
     API endpoint to search for users.
     """
-    users = search_users_db(query)
+    try:
+        users = await search_users_db(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     if not users:
         return JSONResponse(
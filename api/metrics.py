@@ -0,0 +1,96 @@
+import time
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, start_http_server, CONTENT_TYPE_LATEST
+
+# Latency buckets in seconds: API calls are milliseconds, comparisons take tens of seconds
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=REQUEST_LATENCY_BUCKETS
+)
+
+COMPARE_RUNNING = Gauge("compare_running", "Comparisons running on the comparison executor")
+COMPARE_QUEUED = Gauge("compare_queued", "Comparisons waiting for a slot on the comparison executor")
+EXTRACTION_WORKERS_BUSY = Gauge("pose_extraction_workers_busy", "Pose extraction worker processes with work")
+
+POSE_FRAMES_PROCESSED = Counter("pose_frames_processed_total", "Video frames run through pose inference", ["quality"])
+POSE_FRAMES_WITHOUT_POSE = Counter("pose_frames_without_pose_total", "Processed frames where no pose was detected", ["quality"])
+
+DB_CONNECTIONS_OPENED = Counter("db_connections_opened_total", "PostgreSQL connections opened")
+DB_CONNECTION_ERRORS = Counter("db_connection_errors_total", "Failed attempts to connect to PostgreSQL")
+DB_CONNECT_SECONDS = Histogram("db_connect_duration_seconds", "Time taken to open a PostgreSQL connection")
+DB_POOL_IN_USE = Gauge("db_pool_connections_in_use", "Pooled PostgreSQL connections currently borrowed")
+DB_POOL_IDLE = Gauge("db_pool_connections_idle", "Pooled PostgreSQL connections open and idle")
+ASYNC_DB_POOL_IN_USE = Gauge("db_async_pool_connections_in_use", "asyncpg connections currently borrowed")
+ASYNC_DB_POOL_IDLE = Gauge("db_async_pool_connections_idle", "asyncpg connections open and idle")
+
+S3_UPLOAD_BYTES = Counter("s3_upload_bytes_total", "Bytes uploaded to S3")
+S3_UPLOAD_SECONDS = Histogram("s3_upload_duration_seconds", "Time taken by one S3 upload", buckets=REQUEST_LATENCY_BUCKETS)
+
+# Comparison job worker (compare_worker.py)
+COMPARE_JOBS_FINISHED = Counter("compare_jobs_finished_total", "Comparison jobs finished by a worker", ["outcome"])
+COMPARE_JOB_SECONDS = Histogram("compare_job_duration_seconds", "Time taken by one comparison job", buckets=REQUEST_LATENCY_BUCKETS)
+COMPARE_WORKER_ERRORS = Counter("compare_worker_errors_total", "Failed polls of the comparison job queue")
+
+
+def track_compare_executor(executor):
+    '''
+    Reads the comparison queue depth from executor whenever metrics are scraped
+    '''
+    COMPARE_RUNNING.set_function(lambda: executor.stats()["running"])
+    COMPARE_QUEUED.set_function(lambda: executor.stats()["queued"])
+
+def track_extraction_pool(pool):
+    EXTRACTION_WORKERS_BUSY.set_function(lambda: pool.stats()["busy"])
+
+def track_db_pool(pool):
+    DB_POOL_IN_USE.set_function(lambda: pool.stats()["in_use"])
+    DB_POOL_IDLE.set_function(lambda: pool.stats()["idle"])
+
+def track_async_db_pool(pool):
+    ASYNC_DB_POOL_IN_USE.set_function(lambda: pool.get_size() - pool.get_idle_size())
+    ASYNC_DB_POOL_IDLE.set_function(pool.get_idle_size)
+
+def serve_metrics(port: int):
+    '''
+    Serves /metrics on its own port, for processes without an HTTP server of their own
+    '''
+    start_http_server(port)
+
+def latest():
+    '''
+    Returns (body, content type) of the current metrics in the Prometheus text format
+    '''
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request, labelled with the route template
+    (e.g. /compare/jobs/{job_id}) rather than the raw path so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"], route.path if route is not None else "unmatched", str(status)
+            ).observe(time.perf_counter() - start)
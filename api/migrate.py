@@ -0,0 +1,120 @@
+import os
+import re
+import sys
+import time
+import psycopg2
+from db_connect import connect
+
+MIGRATIONS_DIR = os.environ.get(
+    "MIGRATIONS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "postgres", "migrations")
+)
+
+# Table name MACROS
+SCHEMA_MIGRATIONS_TABLE = "schema_migrations"
+
+# Key of the advisory lock held while migrating
+MIGRATION_LOCK_ID = 735201
+
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d{3})_\w+\.sql$")
+
+# Seconds to keep retrying while the database doesn't accept connections (e.g. still starting up)
+MIGRATION_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("MIGRATION_CONNECT_TIMEOUT_SECONDS", "60"))
+
+# Longest wait between two attempts; waits start at one second and double
+MIGRATION_RETRY_MAX_SECONDS = 8.0
+
+# Function to list the migration files as (version, file name), in the order they apply
+def list_migrations(directory: str = MIGRATIONS_DIR):
+    if not os.path.isdir(directory):
+        return []
+
+    migrations = {}
+    for name in os.listdir(directory):
+        match = MIGRATION_FILE_PATTERN.match(name)
+        if match is None:
+            continue
+        version = match.group(1)
+        if version in migrations:
+            raise ValueError(f"Migrations {migrations[version]} and {name} have the same version")
+        migrations[version] = name
+    return sorted(migrations.items())
+
+# Function to get the versions already applied to the database
+def get_applied_versions(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_MIGRATIONS_TABLE} (
+            "version" VARCHAR(10) PRIMARY KEY,
+            "name" VARCHAR(200) NOT NULL,
+            "applied_on" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """)
+    cursor.execute(f"SELECT version FROM {SCHEMA_MIGRATIONS_TABLE}")
+    return {row[0] for row in cursor.fetchall()}
+
+# Function to apply every pending migration. Returns the names of the ones applied.
+def apply_migrations(directory: str = MIGRATIONS_DIR):
+    migrations = list_migrations(directory)
+    applied = []
+
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                applied_versions = get_applied_versions(cursor)
+                conn.commit()
+
+                for version, name in migrations:
+                    if version in applied_versions:
+                        continue
+                    with open(os.path.join(directory, name)) as f:
+                        sql = f.read()
+                    try:
+                        cursor.execute(sql)
+                        cursor.execute(
+                            f"INSERT INTO {SCHEMA_MIGRATIONS_TABLE} (version, name) VALUES (%s, %s)",
+                            (version, name)
+                        )
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    print(f"Applied migration {name}")
+                    applied.append(name)
+            finally:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+
+    return applied
+
+# Function to apply every pending migration once the database accepts connections. Gives up and
+# raises after timeout seconds; a migration that fails to apply is raised straight away.
+def apply_migrations_when_ready(directory: str = MIGRATIONS_DIR, timeout: float = MIGRATION_CONNECT_TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    delay = 1.0
+    while True:
+        try:
+            return apply_migrations(directory)
+        except psycopg2.OperationalError as e:
+            # Errors raised by the server carry a SQLSTATE; failing to connect doesn't
+            if e.pgcode is not None or time.monotonic() + delay > deadline:
+                raise
+            print(f"Database not ready, retrying migrations in {delay:g}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, MIGRATION_RETRY_MAX_SECONDS)
+
+# Function to list every migration with whether it has been applied
+def get_migration_status(directory: str = MIGRATIONS_DIR):
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            applied_versions = get_applied_versions(cursor)
+            conn.commit()
+    return [(name, version in applied_versions) for version, name in list_migrations(directory)]
+
+if __name__ == "__main__":
+    if "--status" in sys.argv[1:]:
+        for name, is_applied in get_migration_status():
+            print(f"{'applied' if is_applied else 'pending':<8} {name}")
+    else:
+        applied = apply_migrations()
+        print(f"{len(applied)} migration(s) applied." if applied else "Database is up to date.")
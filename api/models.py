@@ -39,6 +39,13 @@ class postsUserRequest(BaseModel):
     user_id: int
     timestamp: str
 
+# Feed request body model: `after` is the cursor returned with the previous page
+class postsFeedRequest(BaseModel):
+    user_id: int
+    timestamp: str
+    after: Optional[str] = None
+    limit: Optional[int] = None
+
 class postsClubRequest(BaseModel):
     club_id: int
     timestamp: str
@@ -0,0 +1,355 @@
+import os
+import time
+import queue
+import threading
+import cv2
+import mediapipe as mp
+import numpy as np
+
+mp_pose = mp.solutions.pose
+
+# Settings the Pose model is constructed with; also part of the keypoint cache key
+POSE_SETTINGS = {
+    "model_complexity": 1,
+    "min_detection_confidence": 0.5,
+    "min_tracking_confidence": 0.5,
+}
+
+NUM_LANDMARKS = len(mp_pose.PoseLandmark)
+
+# Values stored per landmark in the keypoint array: x, y, z, visibility
+LANDMARK_FIELDS = 4
+
+# Rate (frames per second) pose inference runs at; higher-fps uploads have frames skipped to match
+ANALYSIS_FPS = float(os.environ.get("ANALYSIS_FPS", "15"))
+
+# Quality profiles trade pose accuracy for throughput. Each sets the Pose model complexity,
+# the largest frame dimension handed to MediaPipe (None keeps full resolution) and the
+# sampling rate. scripts/quality_calibration.py reports how far each strays from "accurate".
+QUALITY_PROFILES = {
+    "fast": {"model_complexity": 0, "max_dimension": 480, "target_fps": 10.0},
+    "balanced": {"model_complexity": 1, "max_dimension": 960, "target_fps": ANALYSIS_FPS},
+    "accurate": {"model_complexity": 2, "max_dimension": None, "target_fps": 30.0},
+}
+
+# Profile used when a request doesn't ask for one; operators can lower it during peak hours
+DEFAULT_QUALITY = os.environ.get("DEFAULT_QUALITY", "balanced")
+
+# Frames decoded ahead of pose inference on a background thread; 0 decodes inline
+PREFETCH_FRAMES = int(os.environ.get("PREFETCH_FRAMES", "4"))
+
+def quality_profile(quality: str = DEFAULT_QUALITY):
+    '''
+    Returns (Pose settings, max frame dimension, sampling rate) of a quality profile
+    '''
+    if quality not in QUALITY_PROFILES:
+        raise ValueError(f"quality must be one of: {', '.join(QUALITY_PROFILES)}")
+    profile = QUALITY_PROFILES[quality]
+    settings = {**POSE_SETTINGS, "model_complexity": profile["model_complexity"]}
+    return settings, profile["max_dimension"], profile["target_fps"]
+
+def cache_key_for(cache, video_path, settings=POSE_SETTINGS, target_fps=ANALYSIS_FPS, max_dimension=None):
+    '''
+    Keypoint cache key of a video extracted with the given Pose settings, sampling rate and frame size
+    '''
+    return cache.key(video_path, {**settings, "target_fps": target_fps, "max_dimension": max_dimension})
+
+def _scaled_size(width, height, max_dimension):
+    '''
+    (width, height) with the longer side capped at max_dimension, or None if no resize is needed
+    '''
+    if max_dimension is None or max(width, height) <= max_dimension:
+        return None
+    scale = max_dimension / max(width, height)
+    return max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+
+def downscale_frame(frame, max_dimension):
+    '''
+    One frame with its longer side capped at max_dimension, resized the same way as in extract_segment
+    '''
+    scaled_size = _scaled_size(frame.shape[1], frame.shape[0], max_dimension)
+    if scaled_size is None:
+        return frame
+    return cv2.resize(frame, scaled_size, interpolation=cv2.INTER_AREA)
+
+def _open_video(video_path, target_fps):
+    '''
+    Opens a video and works out how it is sampled.
+    Returns the capture, the number of source frames advanced per analysed frame,
+    the analysed fps and the (estimated) number of analysed frames.
+    '''
+    cap = cv2.VideoCapture(video_path)
+    source_fps = cap.get(cv2.CAP_PROP_FPS)
+    if not cap.isOpened() or source_fps <= 0:
+        cap.release()
+        raise ValueError(f"Could not read video '{os.path.basename(video_path)}'")
+
+    if target_fps is None or target_fps >= source_fps:
+        step = 1.0
+        fps = source_fps
+    else:
+        step = source_fps / target_fps
+        fps = target_fps
+
+    # The container's frame count is only an estimate
+    frame_estimate = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) / step) + 1
+    return cap, step, fps, frame_estimate
+
+def probe_video(video_path, target_fps=ANALYSIS_FPS):
+    '''
+    Returns (analysed fps, estimated number of analysed frames) without decoding anything
+    '''
+    cap, _, fps, frame_estimate = _open_video(video_path, target_fps)
+    cap.release()
+    return fps, frame_estimate
+
+class FrameBuffers:
+    """
+    Decode, downscale and RGB images reused for every frame of a video, so the decode loop
+    doesn't allocate three full-size images per frame.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.scaled = None
+        self.rgb = None
+        self.allocations = 0
+        self.frames = 0
+
+    def _buffer(self, name, shape):
+        buffer = getattr(self, name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            setattr(self, name, buffer)
+            self.allocations += 1
+        return buffer
+
+    def read(self, cap):
+        '''
+        Decodes the next frame into the frame buffer. Returns None at the end of the video.
+        '''
+        success, frame = cap.read(self.frame)
+        if not success:
+            return None
+        if frame is not self.frame:
+            # OpenCV allocated a new image: the first frame, or the size changed
+            self.frame = frame
+            self.allocations += 1
+        self.frames += 1
+        return frame
+
+    def resize(self, frame, size):
+        scaled = self._buffer("scaled", (size[1], size[0], frame.shape[2]))
+        return cv2.resize(frame, size, dst=scaled, interpolation=cv2.INTER_AREA)
+
+    def to_rgb(self, frame):
+        rgb = self._buffer("rgb", frame.shape)
+        rgb.flags.writeable = True
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        # Read-only lets MediaPipe use the array as it is instead of copying it
+        rgb.flags.writeable = False
+        return rgb
+
+    def allocations_per_frame(self):
+        return self.allocations / self.frames if self.frames else 0.0
+
+def _decode_frames(cap, step, first, end, max_dimension, next_buffers, timings=None):
+    '''
+    Generator over (sample_index, rgb image, buffers) of the analysed frames from sample `first`
+    up to `end`, grabbing and skipping the frames in between. next_buffers() returns the
+    FrameBuffers each frame is decoded into. Time spent decoding is added to
+    timings["decode_seconds"] if timings is given, and each frame's to timings["decode_frame_seconds"] if it is a list.
+    '''
+    # Downscaled size, worked out from the first decoded frame
+    scaled_size = None
+
+    decode_seconds = 0.0
+    # Decode time of the frame being read, including the skipped frames grabbed before it
+    frame_seconds = 0.0
+    decode_frame_seconds = timings.get("decode_frame_seconds") if timings is not None else None
+    sample_index = first
+    source_index = int(round(first * step))
+    next_sample = source_index
+    try:
+        while cap.isOpened() and (end is None or sample_index < end):
+            if source_index < next_sample:
+                # Skipped frames are only grabbed, never decoded into an image
+                started = time.perf_counter()
+                grabbed = cap.grab()
+                elapsed = time.perf_counter() - started
+                decode_seconds += elapsed
+                frame_seconds += elapsed
+                if not grabbed:
+                    break
+                source_index += 1
+                continue
+
+            buffers = next_buffers()
+            started = time.perf_counter()
+            frame = buffers.read(cap)
+            if frame is None:
+                break
+            source_index += 1
+
+            # Shrink before converting so cvtColor and MediaPipe work on fewer pixels
+            if scaled_size is None and max_dimension is not None:
+                scaled_size = _scaled_size(frame.shape[1], frame.shape[0], max_dimension) or False
+            if scaled_size:
+                frame = buffers.resize(frame, scaled_size)
+
+            rgb = buffers.to_rgb(frame)
+            elapsed = time.perf_counter() - started
+            decode_seconds += elapsed
+            if decode_frame_seconds is not None:
+                decode_frame_seconds.append(frame_seconds + elapsed)
+            frame_seconds = 0.0
+            yield sample_index, rgb, buffers
+
+            sample_index += 1
+            next_sample = int(round(sample_index * step))
+    finally:
+        if timings is not None:
+            timings["decode_seconds"] = timings.get("decode_seconds", 0.0) + decode_seconds
+
+
+class _DecoderStopped(Exception):
+    pass
+
+
+class FramePrefetcher:
+    """
+    Decodes frames on a background thread while the caller runs pose inference on earlier ones.
+    """
+
+    _END = object()
+
+    def __init__(self, frames, slots):
+        self._free = queue.Queue()
+        for buffers in slots:
+            self._free.put(buffers)
+        self._ready = queue.Queue()
+        self._stopped = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, args=(frames,), name="frame-decoder", daemon=True)
+        self._thread.start()
+
+    def _next_buffers(self):
+        buffers = self._free.get()
+        if self._stopped.is_set():
+            raise _DecoderStopped()
+        return buffers
+
+    def _run(self, frames):
+        try:
+            for item in frames(self._next_buffers):
+                self._ready.put(item)
+        except _DecoderStopped:
+            pass
+        except Exception as e:
+            self._error = e
+        finally:
+            self._ready.put(self._END)
+
+    def __iter__(self):
+        while True:
+            item = self._ready.get()
+            if item is self._END:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield item[0], item[1]
+            # Done with this frame: the decoder may reuse its buffers
+            self._free.put(item[2])
+
+    def close(self):
+        '''
+        Stops the decoder (if the consumer finished early) and waits for it to exit
+        '''
+        self._stopped.set()
+        # Wake the decoder if it is waiting for a buffer
+        self._free.put(None)
+        self._thread.join()
+
+
+def extract_segment(video_path, pose, target_fps=ANALYSIS_FPS, start=0, end=None, warmup=0, progress=None, max_dimension=None, buffers=None, prefetch=PREFETCH_FRAMES, timings=None):
+    '''
+    Runs pose estimation over analysed frames [start, end) of a video sampled at target_fps
+    (every frame if the video is slower, or if target_fps is None). end=None runs to the end.
+    Frames larger than max_dimension are downscaled first; landmarks are normalized to the
+    frame size, so they come out the same either way.
+    '''
+    cap, step, fps, frame_estimate = _open_video(video_path, target_fps)
+    if buffers is None:
+        buffers = [FrameBuffers() for _ in range(prefetch + 2 if prefetch > 0 else 1)]
+
+    first = max(start - warmup, 0)
+    if first > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(round(first * step)))
+
+    # Grow the buffers if the frame estimate undercounts
+    capacity = max((frame_estimate if end is None else end) - start, 1)
+    keypoints = np.zeros((capacity, NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32)
+    mask = np.zeros(capacity, dtype=bool)
+
+    frames = lambda next_buffers: _decode_frames(cap, step, first, end, max_dimension, next_buffers, timings)
+    if prefetch > 0:
+        prefetcher = FramePrefetcher(frames, buffers[:prefetch + 2])
+        decoded = iter(prefetcher)
+    else:
+        prefetcher = None
+        decoded = ((sample_index, rgb) for sample_index, rgb, _ in frames(lambda: buffers[0]))
+
+    frame_count = 0
+    inference_seconds = 0.0
+    # Per-frame latencies are only kept when asked for (scripts/benchmark.py), totals whenever timings is given
+    inference_frame_seconds = timings.get("inference_frame_seconds") if timings is not None else None
+    try:
+        for sample_index, frame_rgb in decoded:
+            # Process frame for pose estimation
+            if timings is None:
+                results = pose.process(frame_rgb)
+            else:
+                started = time.perf_counter()
+                results = pose.process(frame_rgb)
+                elapsed = time.perf_counter() - started
+                inference_seconds += elapsed
+                if inference_frame_seconds is not None:
+                    inference_frame_seconds.append(elapsed)
+
+            if sample_index < start:
+                continue
+
+            if frame_count == capacity:
+                capacity *= 2
+                keypoints = np.resize(keypoints, (capacity, NUM_LANDMARKS, LANDMARK_FIELDS))
+                mask = np.resize(mask, capacity)
+                mask[frame_count:] = False
+
+            if results.pose_landmarks:
+                keypoints[frame_count] = [(lm.x, lm.y, lm.z, lm.visibility) for lm in results.pose_landmarks.landmark]
+                mask[frame_count] = True
+            # Frames with no detected pose are left zeroed and masked out
+
+            frame_count += 1
+            if progress is not None:
+                progress(frame_count)
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+        cap.release()
+        if timings is not None:
+            timings["inference_seconds"] = timings.get("inference_seconds", 0.0) + inference_seconds
+
+    return keypoints[:frame_count].copy(), mask[:frame_count].copy(), fps
+
+def resample_keypoints(keypoints, mask, fps, target_fps):
+    '''
+    Resamples keypoints onto a target_fps timeline by picking the nearest frame for each sample time
+    '''
+    if len(keypoints) == 0 or abs(fps - target_fps) < 1e-6:
+        return keypoints, mask
+
+    duration = len(keypoints) / fps
+    sample_times = np.arange(int(round(duration * target_fps))) / target_fps
+    indices = np.minimum(np.round(sample_times * fps).astype(np.int64), len(keypoints) - 1)
+    return keypoints[indices], mask[indices]
@@ -0,0 +1,147 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from pose_extraction import mp_pose, POSE_SETTINGS
+
+# Most Pose instances kept per configuration in one process
+POSE_POOL_SIZE = int(os.environ.get("POSE_POOL_SIZE", "4"))
+
+# Seconds to wait for an instance when all of them are checked out
+POSE_POOL_TIMEOUT_SECONDS = float(os.environ.get("POSE_POOL_TIMEOUT_SECONDS", "30"))
+
+
+class PosePoolExhaustedError(Exception):
+    pass
+
+
+def _config_key(settings: dict):
+    return tuple(sorted(settings.items()))
+
+
+class PosePool:
+    """
+    Warm MediaPipe Pose instances, reused across videos instead of being built per request.
+    """
+
+    def __init__(self, max_size: int = POSE_POOL_SIZE):
+        self.max_size = max_size
+        self._condition = threading.Condition()
+        self._configs = {}
+        self.checkouts = 0
+        self.waits = 0
+
+    def _entry(self, settings):
+        key = _config_key(settings)
+        if key not in self._configs:
+            self._configs[key] = {"settings": dict(settings), "idle": [], "in_use": 0}
+        return self._configs[key]
+
+    def acquire(self, settings: dict = POSE_SETTINGS, timeout: float = POSE_POOL_TIMEOUT_SECONDS):
+        '''
+        Checks out a Pose instance for settings, creating one if the pool has room.
+        Raises PosePoolExhaustedError if none is free within timeout seconds.
+        '''
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            entry = self._entry(settings)
+            if not entry["idle"] and entry["in_use"] >= self.max_size:
+                self.waits += 1
+            while not entry["idle"] and entry["in_use"] >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PosePoolExhaustedError(f"All {self.max_size} pose models are busy")
+
+            pose = entry["idle"].pop() if entry["idle"] else None
+            entry["in_use"] += 1
+            self.checkouts += 1
+
+        if pose is None:
+            # Build outside the lock: loading the model takes a while
+            try:
+                pose = mp_pose.Pose(**settings)
+            except Exception:
+                self._discard(settings)
+                raise
+        return pose
+
+    def release(self, pose, settings: dict = POSE_SETTINGS):
+        '''
+        Returns an instance to the pool with its tracking state cleared
+        '''
+        try:
+            pose.reset()
+        except Exception:
+            # A broken graph is not worth keeping around
+            pose.close()
+            self._discard(settings)
+            return
+
+        with self._condition:
+            entry = self._entry(settings)
+            entry["in_use"] -= 1
+            entry["idle"].append(pose)
+            self._condition.notify()
+
+    def _discard(self, settings):
+        with self._condition:
+            self._entry(settings)["in_use"] -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def pose(self, settings: dict = POSE_SETTINGS):
+        '''
+        with pool.pose(settings) as pose: ... checks an instance out for the duration of the block
+        '''
+        pose = self.acquire(settings)
+        try:
+            yield pose
+        finally:
+            self.release(pose, settings)
+
+    def warm(self, settings: dict = POSE_SETTINGS, count: int = 1):
+        '''
+        Loads instances up front so the first videos don't pay for model initialisation
+        '''
+        poses = [self.acquire(settings) for _ in range(min(count, self.max_size))]
+        for pose in poses:
+            self.release(pose, settings)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "max_size": self.max_size,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "configs": [
+                    {
+                        "settings": entry["settings"],
+                        "size": entry["in_use"] + len(entry["idle"]),
+                        "in_use": entry["in_use"],
+                        "idle": len(entry["idle"]),
+                        "utilization": entry["in_use"] / self.max_size if self.max_size else 0.0,
+                    }
+                    for entry in self._configs.values()
+                ],
+            }
+
+    def close(self):
+        with self._condition:
+            for entry in self._configs.values():
+                for pose in entry["idle"]:
+                    pose.close()
+                entry["idle"].clear()
+
+
+_pose_pool = None
+_pose_pool_lock = threading.Lock()
+
+def get_pose_pool():
+    '''
+    Returns the pose pool of this process
+    '''
+    global _pose_pool
+    with _pose_pool_lock:
+        if _pose_pool is None:
+            _pose_pool = PosePool()
+        return _pose_pool
@@ -1,6 +1,8 @@
 import os
-from db_connect import connect
-from models import ClubEvent, ClubPost, UserPost, postsUserRequest, postsClubRequest, EventInterest
+import base64
+from db_connect import connect, async_connect
+from timeline_crud import fan_out_post, fetch_timeline_page, HOME_TIMELINE_ENABLED
+from models import ClubEvent, ClubPost, UserPost, postsUserRequest, postsFeedRequest, postsClubRequest, EventInterest
 from datetime import datetime
 
 UPLOAD_FOLDER = "uploads"
@@ -17,52 +19,112 @@ CLUB_POST_COMMENTS_TABLE = "club_post_comments"
 EVENTS_INTEREST_TABLE = "event_interest"
 MEMBERSHIPS_TABLE = "membership"
 
-def fetch_posts(request_body: postsUserRequest ):
+# Posts per feed page, unless the request asks for another size (up to FEED_MAX_PAGE_SIZE)
+FEED_PAGE_SIZE = int(os.environ.get("FEED_PAGE_SIZE", "50"))
+FEED_MAX_PAGE_SIZE = 200
+
+# Largest SERIAL id
+MAX_POST_ID = 2**31 - 1
+
+# Columns only one of user_posts and club_posts has
+USER_POST_ONLY_FIELDS = ("owner",)
+CLUB_POST_ONLY_FIELDS = ("club", "event_id")
+
+# Function to encode the position of the last post of a feed page, to fetch the page after it
+def encode_feed_cursor(post):
+    cursor = f"{post['created_on'].isoformat()}|{post['type']}|{post['id']}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+def decode_feed_cursor(cursor: str):
+    try:
+        created_on, post_type, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_on), post_type, int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid feed cursor")
+
+# Function to get the id bound of one posts table for a feed position (after_created_on, after_type, after_id):
+# (created_on, id) > (after_created_on, bound) selects exactly the posts of post_type that come after it
+def feed_after_id(post_type: str, after_type: str, after_id: int):
+    if post_type == after_type:
+        return after_id
+    # At after_created_on, every post of a type sorting after after_type is still to come, and none before it
+    return 0 if post_type > after_type else MAX_POST_ID
+
+# Function to get one page of a user's feed: posts by the users they follow and by their clubs, oldest first.
+# Returns the posts and the cursor of the next page (None on the last page).
+async def fetch_posts(request_body: postsFeedRequest):
 
     user_id = request_body.user_id
     timestamp = request_body.timestamp
     timestamp_obj = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
 
-    with connect() as conn:
-        with conn.cursor() as cursor:
-            #fetch posts from all people they are following
-            cursor.execute(
-                   f"""
-                    SELECT * FROM {USER_POSTS_TABLE} 
-                    WHERE owner IN (
-                        SELECT following_id FROM {USER_FOLLOWINGS_TABLE} WHERE user_id = %s
-                    ) 
-                    AND created_on >= %s 
-                    ORDER BY created_on ASC;
-                    """,
-                    (user_id, timestamp_obj)
+    limit = FEED_PAGE_SIZE if request_body.limit is None else request_body.limit
+    if not 1 <= limit <= FEED_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {FEED_MAX_PAGE_SIZE}")
+
+    # Keyset pagination on (created_on, type, id): ids alone are not unique across the two tables.
+    # Per table this is a plain (created_on, id) > (after_created_on, after_id) condition, which
+    # an index on (created_on, id) can serve; without a cursor, the page starts at timestamp.
+    if request_body.after is not None:
+        after_created_on, after_type, after_id = decode_feed_cursor(request_body.after)
+    else:
+        after_created_on, after_type, after_id = timestamp_obj, "", 0
+    user_after_id = feed_after_id("user_post", after_type, after_id)
+    club_after_id = feed_after_id("club_post", after_type, after_id)
+
+    async with async_connect() as conn:
+        if HOME_TIMELINE_ENABLED:
+            rows, last_post = await fetch_timeline_page(
+                conn, user_id, (after_created_on, after_type, after_id),
+                user_after_id, club_after_id, limit
             )
-            user_posts = cursor.fetchall()
-            user_col_names = [desc[0] for desc in cursor.description]
-            user_posts = [dict(zip(user_col_names, row)) for row in user_posts]
-            for post in user_posts:
-                post["type"] = "user_post"
-            
-
-            cursor.execute(
-                f"SELECT * FROM {CLUB_POSTS_TABLE} WHERE club IN "
-                f"(SELECT club_id FROM {MEMBERSHIPS_TABLE} WHERE user_id = %s) AND created_on >= %s ORDER BY created_on ASC;",
-                (user_id, timestamp_obj)
+        else:
+            rows, last_post = await _compute_feed_page(
+                conn, user_id, after_created_on, user_after_id, club_after_id, limit
             )
-            club_posts = cursor.fetchall()
-            club_col_names = [desc[0] for desc in cursor.description]
-            club_posts = [dict(zip(club_col_names, row)) for row in club_posts]
-            for post in club_posts:
-                post["type"] = "club_post"
-            
-            
-            if len(user_posts) != 0 and len(club_posts) != 0:
-                if user_posts[-1]["created_on"] > club_posts[-1]["created_on"]:
-                    return club_posts + user_posts
-                else:
-                    return user_posts + club_posts
-            else: #order doesnt matter because on of them is empty anyway
-                return user_posts + club_posts
+
+    # Keep the same fields as each table's own rows
+    posts = []
+    for row in rows:
+        post = dict(row)
+        for field in (USER_POST_ONLY_FIELDS if post["type"] == "club_post" else CLUB_POST_ONLY_FIELDS):
+            del post[field]
+        posts.append(post)
+
+    next_cursor = encode_feed_cursor(last_post) if last_post is not None else None
+    return posts, next_cursor
+
+# One feed page computed at read time, with parameters user_id, after_created_on, user_after_id, club_after_id and limit.
+# One round trip: each branch stops after `limit` rows, then the merged page is cut to `limit`
+FEED_PAGE_QUERY = f"""
+    (
+        SELECT id, title, owner, NULL::INTEGER AS club, description, video_url, picture_url,
+            NULL::INTEGER AS event_id, created_on, 'user_post' AS type
+        FROM {USER_POSTS_TABLE}
+        WHERE owner IN (SELECT following_id FROM {USER_FOLLOWINGS_TABLE} WHERE user_id = $1)
+        AND (created_on, id) > ($2, $3)
+        ORDER BY created_on, id
+        LIMIT $5
+    )
+    UNION ALL
+    (
+        SELECT id, title, NULL::INTEGER AS owner, club, description, video_url, picture_url,
+            event_id, created_on, 'club_post' AS type
+        FROM {CLUB_POSTS_TABLE}
+        WHERE club IN (SELECT club_id FROM {MEMBERSHIPS_TABLE} WHERE user_id = $1)
+        AND (created_on, id) > ($2, $4)
+        ORDER BY created_on, id
+        LIMIT $5
+    )
+    ORDER BY created_on, type, id
+    LIMIT $5
+"""
+
+# Function to compute a feed page at read time, from the followings and memberships of the user.
+# Returns the rows and, if the page is full, its last row.
+async def _compute_feed_page(conn, user_id: int, after_created_on, user_after_id: int, club_after_id: int, limit: int):
+    rows = await conn.fetch(FEED_PAGE_QUERY, user_id, after_created_on, user_after_id, club_after_id, limit)
+    return rows, (rows[-1] if len(rows) == limit else None)
 
 def create_user_post_db(title, owner, desc , created_on,  pic_url = None, vid_url = None ):
     timestamp_obj = datetime.fromisoformat(created_on.replace("Z", "+00:00"))
@@ -76,6 +138,7 @@ def create_user_post_db(title, owner, desc , created_on,  pic_url = None, vid_ur
             )
             # Fetch the returned ID
             inserted_id = cursor.fetchone()[0]
+            fan_out_post(cursor, "user", owner, inserted_id, timestamp_obj)
             conn.commit()
     
     return inserted_id
@@ -92,9 +155,10 @@ def create_club_post_db(request_body : ClubPost):
     with connect() as conn:
         with conn.cursor() as cursor: 
             cursor.execute(
-                f"INSERT INTO {CLUB_POSTS_TABLE} (title, club, description, video_url, picture_url, event_id, created_on) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                f"INSERT INTO {CLUB_POSTS_TABLE} (title, club, description, video_url, picture_url, event_id, created_on) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id",
                 (title, club_id, desc, vid_url, pic_url, event_id, timestamp_obj)
             )
+            fan_out_post(cursor, "club", club_id, cursor.fetchone()[0], timestamp_obj)
             conn.commit()
 
 
@@ -131,31 +195,30 @@ def create_club_event_db(request_body : ClubEvent):
             return event_id[0]
 
 
+# Events of the clubs of a user since a time, with parameters user_id and since
+USER_CLUB_EVENTS_QUERY = (
+    f"SELECT * FROM {EVENTS_TABLE} WHERE club IN "
+    f"(SELECT club_id FROM {MEMBERSHIPS_TABLE} WHERE user_id = $1) AND created_on >= $2 ORDER BY created_on ASC;"
+)
+
 # Function to get all club events for a given user
-def get_events_by_user_id(request_body: postsUserRequest):
+async def get_events_by_user_id(request_body: postsUserRequest):
 
     user_id = request_body.user_id
     timestamp = request_body.timestamp
     timestamp_obj = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
 
-    with connect() as conn:
-        with conn.cursor() as cursor:
-            # Check if user exists
-            cursor.execute(f"SELECT id FROM {USERS_TABLE} WHERE id = %s", (user_id,))
-            if cursor.fetchone() is None:
-                raise ValueError("User does not exist")
-            
-            cursor.execute(
-                f"SELECT * FROM {EVENTS_TABLE} WHERE club IN "
-                f"(SELECT club_id FROM {MEMBERSHIPS_TABLE} WHERE user_id = %s) AND created_on >= %s ORDER BY created_on ASC;",
-                (user_id, timestamp_obj)
-            )
-            club_events = cursor.fetchall()
-            club_col_names = [desc[0] for desc in cursor.description]
-            club_events = [dict(zip(club_col_names, row)) for row in club_events]
-
-            return club_events
+    async with async_connect() as conn:
+        # Check if user exists
+        if await conn.fetchval(f"SELECT id FROM {USERS_TABLE} WHERE id = $1", user_id) is None:
+            raise ValueError("User does not exist")
+        
+        club_events = await conn.fetch(USER_CLUB_EVENTS_QUERY, user_id, timestamp_obj)
+        return [dict(event) for event in club_events]
         
+# Events of a club since a time, with parameters club_id and since
+CLUB_EVENTS_QUERY = f"SELECT * FROM {EVENTS_TABLE} WHERE club = %s AND created_on >= %s ORDER BY created_on ASC;"
+
 # Function to get all club events for a given club
 def get_events_by_club_id(request_body: postsClubRequest):
 
@@ -170,10 +233,7 @@ def get_events_by_club_id(request_body: postsClubRequest):
             if cursor.fetchone() is None:
                 raise ValueError("Club does not exist")
             
-            cursor.execute(
-                f"SELECT * FROM {EVENTS_TABLE} WHERE club = %s AND created_on >= %s ORDER BY created_on ASC;",
-                (club_id, timestamp_obj)
-            )
+            cursor.execute(CLUB_EVENTS_QUERY, (club_id, timestamp_obj))
             club_events = cursor.fetchall()
             club_col_names = [desc[0] for desc in cursor.description]
 
@@ -293,6 +353,14 @@ def get_interested_events_by_user_id(user_id: int):
     events = [dict(zip(column_names, row)) for row in rows]
     return events
             
+# Users interested in an event, with parameter event_id
+EVENT_INTERESTED_USERS_QUERY = f"""
+    SELECT u.id AS user_id, u.username
+    FROM {USERS_TABLE} AS u
+    JOIN {EVENTS_INTEREST_TABLE} AS ei ON u.id = ei.user_id
+    WHERE ei.event_id = %s;
+"""
+
 # Function to get all users interested in an event
 def get_interested_users_by_event_id(event_id: int):
     with connect() as conn:
@@ -303,12 +371,7 @@ def get_interested_users_by_event_id(event_id: int):
                 raise ValueError("Event does not exist")
             
             # Query the users interested in the event.
-            cursor.execute(f"""
-                SELECT u.id AS user_id, u.username
-                FROM {USERS_TABLE} AS u
-                JOIN {EVENTS_INTEREST_TABLE} AS ei ON u.id = ei.user_id
-                WHERE ei.event_id = %s;
-            """, (event_id,))
+            cursor.execute(EVENT_INTERESTED_USERS_QUERY, (event_id,))
 
             rows = cursor.fetchall()
             # Extract column names from the cursor description.
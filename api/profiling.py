@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager, nullcontext
+
+# Set to a file path to append every finished trace to it as a JSON line
+PROFILE_LOG_PATH = os.environ.get("PROFILE_LOG_PATH")
+
+# Trace every comparison for the sinks, not only the ones sent with debug=true
+PROFILE_ALL_REQUESTS = os.environ.get("PROFILE_ALL_REQUESTS", "false").lower() == "true"
+
+_current_trace = contextvars.ContextVar("profiling_trace", default=None)
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+class Trace:
+    """
+    Timings collected while one comparison runs
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.videos = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float, calls: int = 1):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"seconds": 0.0, "calls": 0})
+            entry["seconds"] += seconds
+            entry["calls"] += calls
+
+    def add_video(self, name: str, frames: int, frames_without_pose: int, cached: bool, decode_seconds=0.0, inference_seconds=0.0):
+        with self._lock:
+            self.videos.append({
+                "video": name,
+                "frames": frames,
+                "frames_without_pose": frames_without_pose,
+                "cached": cached,
+                "decode_seconds": round(decode_seconds, 4),
+                "inference_seconds": round(inference_seconds, 4),
+            })
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "stages": {
+                    stage: {"seconds": round(entry["seconds"], 4), "calls": entry["calls"]}
+                    for stage, entry in self.stages.items()
+                },
+                "videos": list(self.videos),
+                "frames_processed": sum(video["frames"] for video in self.videos if not video["cached"]),
+                "frames_without_pose": sum(video["frames_without_pose"] for video in self.videos),
+            }
+
+
+def current_trace():
+    '''
+    The active trace, or None when profiling is off
+    '''
+    return _current_trace.get()
+
+@contextmanager
+def trace(enabled: bool = True, **labels):
+    '''
+    Starts a trace for the duration of the block (or does nothing if not enabled). The whole block
+    is recorded as the "total" stage, and the finished trace is emitted to the sinks with labels.
+    '''
+    if not enabled:
+        yield None
+        return
+
+    new_trace = Trace()
+    token = _current_trace.set(new_trace)
+    start = time.perf_counter()
+    try:
+        yield new_trace
+    finally:
+        new_trace.add("total", time.perf_counter() - start)
+        _current_trace.reset(token)
+        _emit({**labels, **new_trace.to_dict()})
+
+@contextmanager
+def _timed_stage(active_trace, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        active_trace.add(name, time.perf_counter() - start)
+
+def stage(name: str):
+    '''
+    with profiling.stage("name"): ... records the block's wall time under name, if a trace is active
+    '''
+    active_trace = _current_trace.get()
+    if active_trace is None:
+        return nullcontext()
+    return _timed_stage(active_trace, name)
+
+def timed(name: str):
+    '''
+    Decorator that records every call of the function as stage name, if a trace is active
+    '''
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            active_trace = _current_trace.get()
+            if active_trace is None:
+                return fn(*args, **kwargs)
+            with _timed_stage(active_trace, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def register_sink(sink):
+    '''
+    Registers sink(timings: dict) to be called with every finished trace
+    '''
+    with _sinks_lock:
+        _sinks.append(sink)
+
+def _emit(timings):
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(timings)
+        except Exception as e:
+            # Profiling must never break a comparison
+            print(f"Profiling sink failed: {e}")
+
+
+class JsonLinesSink:
+    """
+    Appends every trace to a file as one JSON object per line
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, timings):
+        line = json.dumps({"time": time.time(), **timings})
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+if PROFILE_LOG_PATH:
+    register_sink(JsonLinesSink(PROFILE_LOG_PATH))
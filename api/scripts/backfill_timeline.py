@@ -0,0 +1,19 @@
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from timeline_crud import rebuild_timelines, TIMELINE_BACKFILL_BATCH_SIZE
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the precomputed home timelines")
+    parser.add_argument("--user", type=int, action="append", help="Only rebuild this user's timeline (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=TIMELINE_BACKFILL_BATCH_SIZE, help="Users rebuilt per transaction")
+    args = parser.parse_args()
+
+    def progress(done, total):
+        print(f"Rebuilt {done}/{total} timelines")
+
+    total = rebuild_timelines(args.user, args.batch_size, progress)
+    print(f"Done: {total} timeline(s) rebuilt.")
@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import itertools
+import resource
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import mediapipe as mp
+from alignment import align_frames
+from compare_videos import pose_features, calculate_differences, evaluate_video, JOINTS, THRESHOLDS, DTW_BAND_SECONDS
+from pose_extraction import extract_segment, quality_profile, resample_keypoints, mp_pose, DEFAULT_QUALITY
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Relative slowdown that counts as a regression when comparing two runs
+REGRESSION_THRESHOLD = 0.10
+
+# Latency differences below this (in ms) are noise, whatever the relative change
+MIN_LATENCY_DELTA_MS = 0.05
+
+
+def summarize(latencies_s, frames=None):
+    '''
+    Total, p50, p95 and max (in ms) of a list of latencies in seconds, plus throughput if frames is given
+    '''
+    latencies_ms = np.asarray(latencies_s) * 1000
+    total_s = float(np.sum(latencies_s))
+    summary = {
+        "count": len(latencies_ms),
+        "total_s": round(total_s, 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 4),
+        "max_ms": round(float(np.max(latencies_ms)), 4),
+    }
+    if frames is not None:
+        summary["fps"] = round(frames / total_s, 2) if total_s > 0 else None
+    return summary
+
+def time_extraction(video_path, pose, target_fps, max_dimension):
+    '''
+    Extracts one video inline, returning (keypoints, mask, fps) and per-frame decode and inference latencies
+    '''
+    # extract_segment times each frame's decode (read + resize + colour conversion) and inference itself
+    timings = {"decode_frame_seconds": [], "inference_frame_seconds": []}
+    keypoints, mask, fps = extract_segment(video_path, pose, target_fps, max_dimension=max_dimension, prefetch=0, timings=timings)
+    pose.reset()
+    return (keypoints, mask, fps), timings["decode_frame_seconds"], timings["inference_frame_seconds"]
+
+def run_benchmark(videos_dir, quality, alignment, repeat):
+    video_paths = sorted(
+        os.path.join(videos_dir, name) for name in os.listdir(videos_dir) if name.endswith(".mp4")
+    )
+    settings, max_dimension, target_fps = quality_profile(quality)
+    pose = mp_pose.Pose(**settings)
+
+    # Load the model and warm up caches before anything is timed
+    time_extraction(video_paths[0], pose, target_fps, max_dimension)
+
+    extracted, videos = {}, {}
+    decode_all, inference_all = [], []
+    for video_path in video_paths:
+        print(f"Extracting {os.path.basename(video_path)}...")
+        extracted[video_path], decode, inference = time_extraction(video_path, pose, target_fps, max_dimension)
+        decode_all += decode
+        inference_all += inference
+        frames = len(decode)
+        videos[os.path.basename(video_path)] = {
+            "frames": frames,
+            "decode_s": round(sum(decode), 4),
+            "inference_s": round(sum(inference), 4),
+            "fps": round(frames / (sum(decode) + sum(inference)), 2),
+        }
+    pose.close()
+
+    alignment_times, difference_times, evaluation_times = [], [], []
+    pairs = list(itertools.combinations(video_paths, 2))
+    print(f"Scoring {len(pairs)} pairs {repeat} times each...")
+    for video1_path, video2_path in pairs:
+        keypoints1, mask1, fps1 = extracted[video1_path]
+        keypoints2, mask2, fps2 = extracted[video2_path]
+        fps = min(fps1, fps2)
+        keypoints1, mask1 = resample_keypoints(keypoints1, mask1, fps1, fps)
+        keypoints2, mask2 = resample_keypoints(keypoints2, mask2, fps2, fps)
+        band = int(round(DTW_BAND_SECONDS * fps))
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            path = align_frames(pose_features(keypoints1, mask1, JOINTS), pose_features(keypoints2, mask2, JOINTS), alignment, band)
+            aligned = time.perf_counter()
+            distances, joint_distances = calculate_differences(keypoints1, mask1, keypoints2, mask2, JOINTS, path)
+            calculated = time.perf_counter()
+            evaluate_video(distances, joint_distances, fps, THRESHOLDS, path=path)
+            evaluated = time.perf_counter()
+
+            alignment_times.append(aligned - start)
+            difference_times.append(calculated - aligned)
+            evaluation_times.append(evaluated - calculated)
+
+    total_frames = len(decode_all)
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "mediapipe": mp.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quality": quality,
+            "alignment": alignment,
+            "repeat": repeat,
+            "videos": len(video_paths),
+            "pairs": len(pairs),
+        },
+        "stages": {
+            "decode": summarize(decode_all, total_frames),
+            "inference": summarize(inference_all, total_frames),
+            "alignment": summarize(alignment_times),
+            "difference": summarize(difference_times),
+            "evaluation": summarize(evaluation_times),
+        },
+        "videos": videos,
+        "frames": total_frames,
+        "extraction_fps": round(total_frames / (sum(decode_all) + sum(inference_all)), 2),
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+def compare_runs(base, new, threshold=REGRESSION_THRESHOLD):
+    '''
+    Lists every metric of two runs, flagging the ones that got worse by more than threshold
+    '''
+    rows = []
+
+    def check(name, base_value, new_value, higher_is_better=False, min_delta=0.0):
+        if base_value is None or new_value is None:
+            return
+        change = (new_value - base_value) / base_value if base_value else 0.0
+        worse = -change if higher_is_better else change
+        regressed = worse > threshold and abs(new_value - base_value) > min_delta
+        rows.append((name, base_value, new_value, change, regressed))
+
+    for stage in base["stages"]:
+        if stage not in new["stages"]:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            check(f"{stage}.{metric}", base["stages"][stage][metric], new["stages"][stage][metric], min_delta=MIN_LATENCY_DELTA_MS)
+        if "fps" in base["stages"][stage]:
+            check(f"{stage}.fps", base["stages"][stage]["fps"], new["stages"][stage].get("fps"), higher_is_better=True)
+    check("extraction_fps", base["extraction_fps"], new["extraction_fps"], higher_is_better=True)
+    check("peak_rss_mb", base["peak_rss_mb"], new["peak_rss_mb"])
+    return rows
+
+def print_comparison(rows, base, new):
+    for field in ("quality", "alignment", "cpu_count", "mediapipe"):
+        if base["meta"].get(field) != new["meta"].get(field):
+            print(f"Warning: runs differ in {field} ({base['meta'].get(field)} vs {new['meta'].get(field)})")
+
+    print(f"{'metric':<24}{'base':>12}{'new':>12}{'change':>10}")
+    for name, base_value, new_value, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<24}{base_value:>12.4f}{new_value:>12.4f}{change:>+10.1%}{flag}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the comparison pipeline on sample videos")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Time every stage and write the results as JSON")
+    run_parser.add_argument("--videos", default=os.path.join(SCRIPT_DIR, "..", "..", "sample_videos"))
+    run_parser.add_argument("--quality", default=DEFAULT_QUALITY)
+    run_parser.add_argument("--alignment", default="dtw")
+    run_parser.add_argument("--repeat", type=int, default=20, help="Times each pair is scored")
+    run_parser.add_argument("--output", default="benchmark.json")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two runs and flag regressions")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Relative slowdown flagged as a regression")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_benchmark(args.videos, args.quality, args.alignment, args.repeat)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(json.dumps(results["stages"], indent=2))
+        print(f"Extraction: {results['extraction_fps']} fps, peak RSS {results['peak_rss_mb']} MB. Written to {args.output}")
+    else:
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        rows = compare_runs(base, new, args.threshold)
+        print_comparison(rows, base, new)
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions.")
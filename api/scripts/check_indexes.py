@@ -0,0 +1,116 @@
+import os
+import sys
+import argparse
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db_connect import connect
+from search import like_pattern, SEARCH_RESULTS_LIMIT
+from posts_event_crud import FEED_PAGE_QUERY, USER_CLUB_EVENTS_QUERY, CLUB_EVENTS_QUERY, EVENT_INTERESTED_USERS_QUERY, FEED_PAGE_SIZE, feed_after_id
+from timeline_crud import TIMELINE_PAGE_QUERY
+from crud import USER_FOLLOWERS_QUERY, CLUB_MEMBERS_QUERY, USER_SEARCH_QUERY
+from clubs_crud import CLUB_SEARCH_QUERY
+
+SINCE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SEARCH = "dan"
+
+# (query, the CRUD function that runs it, its SQL, the parameters it is run with, indexes the plan must use).
+# Queries with $n placeholders are run through asyncpg, the others through psycopg2.
+QUERIES = [
+    (
+        "feed: followed users and clubs", "posts_event_crud._compute_feed_page", FEED_PAGE_QUERY,
+        (1, SINCE, feed_after_id("user_post", "", 0), feed_after_id("club_post", "", 0), FEED_PAGE_SIZE),
+        ["user_posts_owner_created_on_idx", "club_posts_club_created_on_idx"],
+    ),
+    (
+        "feed: home timeline", "timeline_crud.fetch_timeline_page", TIMELINE_PAGE_QUERY,
+        (1, SINCE, "", 0, feed_after_id("user_post", "", 0), feed_after_id("club_post", "", 0), FEED_PAGE_SIZE),
+        ["home_timeline_pkey"],
+    ),
+    (
+        "events of a user's clubs", "posts_event_crud.get_events_by_user_id", USER_CLUB_EVENTS_QUERY,
+        (1, SINCE), ["events_club_created_on_idx"],
+    ),
+    (
+        "events of a club", "posts_event_crud.get_events_by_club_id", CLUB_EVENTS_QUERY,
+        (1, SINCE), ["events_club_created_on_idx"],
+    ),
+    (
+        "followers of a user", "crud.get_user_followers", USER_FOLLOWERS_QUERY,
+        (1,), ["user_following_following_id_idx"],
+    ),
+    (
+        "users interested in an event", "posts_event_crud.get_interested_users_by_event_id", EVENT_INTERESTED_USERS_QUERY,
+        (1,), ["event_interest_event_id_idx"],
+    ),
+    (
+        "members of a club", "crud.get_club_members_by_id", CLUB_MEMBERS_QUERY,
+        (1,), ["membership_club_id_idx"],
+    ),
+    (
+        "user search", "crud.search_users_db", USER_SEARCH_QUERY,
+        (like_pattern(SEARCH), SEARCH, SEARCH_RESULTS_LIMIT), ["users_username_trgm_idx"],
+    ),
+    (
+        "club search", "clubs_crud.search_clubs_db", CLUB_SEARCH_QUERY,
+        (like_pattern(SEARCH), SEARCH, SEARCH_RESULTS_LIMIT), ["clubs_name_trgm_idx", "clubs_club_tag_trgm_idx"],
+    ),
+]
+
+def plan_indexes(plan):
+    '''
+    Every index used anywhere in an EXPLAIN (FORMAT JSON) plan node and its children
+    '''
+    indexes = set()
+    if "Index Name" in plan:
+        indexes.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        indexes |= plan_indexes(child)
+    return indexes
+
+def explain(cursor, sql, params):
+    '''
+    EXPLAINs sql with params bound the way its driver binds them: asyncpg prepares $n queries
+    and sends the parameters separately, psycopg2 substitutes %s into the query text
+    '''
+    if "$1" in sql:
+        cursor.execute("PREPARE checked_query AS " + sql)
+        cursor.execute(f"EXPLAIN (FORMAT JSON) EXECUTE checked_query({', '.join(['%s'] * len(params))})", params)
+        plan = cursor.fetchone()[0][0]["Plan"]
+        cursor.execute("DEALLOCATE checked_query")
+        return plan
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    return cursor.fetchone()[0][0]["Plan"]
+
+def check_indexes(verbose=False):
+    '''
+    Returns the names of the queries whose plans miss an expected index
+    '''
+    failures = []
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, source, sql, params, expected in QUERIES:
+                plan = explain(cursor, sql, params)
+                used = plan_indexes(plan)
+                missing = [index for index in expected if index not in used]
+                status = "ok" if not missing else "MISSING " + ", ".join(missing)
+                print(f"{name:<32}{source:<52}{status}")
+                if verbose:
+                    print(f"    uses: {', '.join(sorted(used)) or 'no index'}")
+                if missing:
+                    failures.append(name)
+            conn.rollback()
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the CRUD queries use their indexes")
+    parser.add_argument("--verbose", action="store_true", help="List every index each plan uses")
+    args = parser.parse_args()
+
+    failures = check_indexes(args.verbose)
+    if failures:
+        print(f"{len(failures)} query(s) not using their index. Run `python migrate.py` and check the queries above.")
+        sys.exit(1)
+    print("All queries use their indexes.")
@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import argparse
+import itertools
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from compare_videos import compare_keypoints, JOINTS, EVALUATION_LABELS
+from extraction_pool import ExtractionPool
+from pose_extraction import QUALITY_PROFILES, resample_keypoints
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REFERENCE_PROFILE = "accurate"
+
+def extract_all(video_paths, quality):
+    '''
+    Extracts every video with one profile, returning {path: (keypoints, mask, fps)} and the seconds taken
+    '''
+    pool = ExtractionPool(workers=0, warm_quality=quality)
+    # Load the model before timing so every profile is measured warm
+    pool.extract(video_paths[0], quality=quality)
+
+    start = time.perf_counter()
+    results = {path: pool.extract(path, quality=quality) for path in video_paths}
+    return results, time.perf_counter() - start
+
+def label_shares(result):
+    total = sum(result["evaluations"].values()) or 1
+    return np.array([result["evaluations"][label] / total for label in EVALUATION_LABELS])
+
+def landmark_error(extracted, reference):
+    '''
+    Mean (x, y) distance of the weighted joints from the reference profile's, on the reference's timeline,
+    over frames where both detected a pose
+    '''
+    keypoints, mask, fps = extracted
+    reference_keypoints, reference_mask, reference_fps = reference
+    keypoints, mask = resample_keypoints(keypoints, mask, fps, reference_fps)
+    frames = min(len(keypoints), len(reference_keypoints))
+    both = mask[:frames] & reference_mask[:frames]
+    if not both.any():
+        return float("nan")
+
+    joint_indices = [int(joint_idx) for joint_idx, _, _ in JOINTS]
+    xy = keypoints[:frames][both][:, joint_indices, :2]
+    reference_xy = reference_keypoints[:frames][both][:, joint_indices, :2]
+    return float(np.linalg.norm(xy - reference_xy, axis=2).mean())
+
+def run_calibration(videos_dir, alignment, model_complexity=None):
+    if model_complexity is not None:
+        # Every profile on the one model that is available: only frame size and sampling rate differ
+        for profile in QUALITY_PROFILES.values():
+            profile["model_complexity"] = model_complexity
+
+    video_paths = sorted(
+        os.path.join(videos_dir, name) for name in os.listdir(videos_dir) if name.endswith(".mp4")
+    )
+    pairs = list(itertools.combinations(video_paths, 2))
+
+    extracted, timings, results = {}, {}, {}
+    for quality in QUALITY_PROFILES:
+        print(f"Extracting {len(video_paths)} videos with the '{quality}' profile...")
+        extracted[quality], timings[quality] = extract_all(video_paths, quality)
+        results[quality] = {
+            pair: compare_keypoints(*extracted[quality][pair[0]], *extracted[quality][pair[1]], alignment)
+            for pair in pairs
+        }
+
+    # Length of the whole set, at the reference profile's sampling rate
+    video_seconds = sum(len(keypoints) / fps for keypoints, _, fps in extracted[REFERENCE_PROFILE].values())
+
+    rows = []
+    for quality in QUALITY_PROFILES:
+        share_deviation = [
+            0.5 * np.abs(label_shares(results[quality][pair]) - label_shares(results[REFERENCE_PROFILE][pair])).sum()
+            for pair in pairs
+        ]
+        same_overall = sum(
+            results[quality][pair]["overall_evaluation"] == results[REFERENCE_PROFILE][pair]["overall_evaluation"]
+            for pair in pairs
+        )
+        errors = [landmark_error(extracted[quality][path], extracted[REFERENCE_PROFILE][path]) for path in video_paths]
+        rows.append({
+            "quality": quality,
+            "profile": QUALITY_PROFILES[quality],
+            "seconds": timings[quality],
+            "speed": video_seconds / timings[quality],
+            "mean_share_deviation": float(np.mean(share_deviation)),
+            "max_share_deviation": float(np.max(share_deviation)),
+            "same_overall": same_overall,
+            "landmark_error": float(np.nanmean(errors)),
+        })
+
+    return rows, video_paths, pairs, video_seconds
+
+def format_report(rows, video_paths, pairs, video_seconds, alignment, model_complexity=None):
+    lines = [
+        "# Quality profile calibration",
+        "",
+        f"Generated by `scripts/quality_calibration.py` on {len(video_paths)} clips in `sample_videos/` "
+        f"({video_seconds:.1f} s of video in total) and all {len(pairs)} pairs of them, with `{alignment}` alignment. "
+        f"Deviations are measured against the `{REFERENCE_PROFILE}` profile. Extraction ran on a single process.",
+        "",
+    ]
+    if model_complexity is not None:
+        lines += [
+            f"> **Partial calibration**: every profile ran with `model_complexity` {model_complexity} (`--model-complexity`), "
+            "so the numbers below only measure the effect of each profile's frame size and sampling rate, not of its model. "
+            "Re-run the script without `--model-complexity` where the MediaPipe lite and heavy models can be downloaded "
+            "to get the full comparison.",
+            "",
+        ]
+    lines += [
+        "- **Speed**: seconds of video extracted per second of processing.",
+        "- **Label deviation**: share of compared frames whose Excellent/Good/Fair/Poor label differs from "
+        "the reference profile's (half the L1 distance between the label distributions), mean and worst pair.",
+        "- **Same overall**: pairs whose overall evaluation matches the reference profile's.",
+        "- **Landmark error**: mean (x, y) distance of the scored joints from the reference profile's landmarks, "
+        "in normalized image coordinates.",
+        "",
+        "| Profile | model_complexity | max_dimension | target_fps | Extraction (s) | Speed | Label deviation (mean / max) | Same overall | Landmark error |",
+        "|---|---|---|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        profile = row["profile"]
+        lines.append(
+            f"| {row['quality']} | {profile['model_complexity']} | {profile['max_dimension'] or 'full'} | {profile['target_fps']:g} "
+            f"| {row['seconds']:.1f} | {row['speed']:.1f}x | {row['mean_share_deviation']:.1%} / {row['max_share_deviation']:.1%} "
+            f"| {row['same_overall']}/{len(pairs)} | {row['landmark_error']:.4f} |"
+        )
+    return "\n".join(lines) + "\n"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the quality profiles against 'accurate' on sample videos")
+    parser.add_argument("--videos", default=os.path.join(SCRIPT_DIR, "..", "..", "sample_videos"))
+    parser.add_argument("--alignment", default="zip")
+    parser.add_argument("--output", default=os.path.join(SCRIPT_DIR, "quality_calibration.md"))
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1, 2],
+                        help="Run every profile with this model, e.g. when the others can't be downloaded")
+    args = parser.parse_args()
+
+    rows, video_paths, pairs, video_seconds = run_calibration(args.videos, args.alignment, args.model_complexity)
+    report = format_report(rows, video_paths, pairs, video_seconds, args.alignment, args.model_complexity)
+    with open(args.output, "w") as f:
+        f.write(report)
+    print(report)
@@ -0,0 +1,103 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from alignment import dtw_path, zip_path, align_frames
+
+def random_features(rng, frames, dims=8, missing=0.1):
+    """Unit-length feature vectors, with some frames zeroed as if no pose was detected."""
+    features = rng.normal(size=(frames, dims))
+    features /= np.linalg.norm(features, axis=1, keepdims=True)
+    features[rng.random(frames) < missing] = 0
+    return features
+
+def brute_force_dtw(features1, features2, allowed=None):
+    """Textbook O(n * m) DTW over the cells where allowed is True (all of them by default); returns the cost."""
+    n, m = len(features1), len(features2)
+    cost = 1.0 - features1 @ features2.T
+    if allowed is None:
+        allowed = np.ones((n, m), dtype=bool)
+    total = np.full((n, m), np.inf)
+    for i in range(n):
+        for j in range(m):
+            if not allowed[i, j]:
+                continue
+            if i == 0 and j == 0:
+                total[i, j] = cost[i, j]
+                continue
+            best = min(
+                total[i - 1, j] if i > 0 else np.inf,
+                total[i, j - 1] if j > 0 else np.inf,
+                total[i - 1, j - 1] if i > 0 and j > 0 else np.inf,
+            )
+            total[i, j] = cost[i, j] + best
+    return total[n - 1, m - 1]
+
+def band_cells(n, m, band):
+    """Cells dtw_path evaluates: within band frames of the length-scaled diagonal."""
+    band = max(band, int(np.ceil(m / n)), 1)
+    centers = np.round(np.arange(n) * ((m - 1) / max(n - 1, 1))).astype(np.int64)
+    columns = np.arange(m)
+    return np.abs(columns[None, :] - centers[:, None]) <= band
+
+def path_cost(features1, features2, path):
+    return float(sum(1.0 - features1[i] @ features2[j] for i, j in path))
+
+class TestAlignment(unittest.TestCase):
+
+    def assert_valid_path(self, path, n, m):
+        self.assertEqual(tuple(path[0]), (0, 0))
+        self.assertEqual(tuple(path[-1]), (n - 1, m - 1))
+        steps = {tuple(step) for step in np.diff(path, axis=0)}
+        self.assertTrue(steps <= {(0, 1), (1, 0), (1, 1)}, f"Invalid steps {steps}")
+
+    def test_wide_band_matches_full_dtw(self):
+        """Ensure a band wider than both videos gives the same cost as unconstrained DTW."""
+        rng = np.random.default_rng(0)
+        for n, m in [(1, 1), (1, 7), (7, 1), (12, 12), (15, 9), (9, 23)]:
+            features1, features2 = random_features(rng, n), random_features(rng, m)
+            path = dtw_path(features1, features2, band=max(n, m))
+
+            self.assert_valid_path(path, n, m)
+            self.assertAlmostEqual(path_cost(features1, features2, path), brute_force_dtw(features1, features2), places=9)
+
+    def test_narrow_band_matches_banded_dtw(self):
+        """Ensure a narrow band gives the optimal cost among paths inside the band."""
+        rng = np.random.default_rng(1)
+        for n, m, band in [(30, 30, 2), (40, 25, 3), (25, 40, 1), (50, 45, 5)]:
+            features1, features2 = random_features(rng, n), random_features(rng, m)
+            path = dtw_path(features1, features2, band)
+
+            self.assert_valid_path(path, n, m)
+            allowed = band_cells(n, m, band)
+            self.assertTrue(all(allowed[i, j] for i, j in path))
+            self.assertAlmostEqual(
+                path_cost(features1, features2, path),
+                brute_force_dtw(features1, features2, allowed),
+                places=9
+            )
+
+    def test_recovers_time_shift(self):
+        """Ensure DTW pairs frames of a delayed copy of a sequence with the original frames."""
+        rng = np.random.default_rng(2)
+        reference = random_features(rng, 40, missing=0)
+        delayed = np.concatenate([reference[:1].repeat(5, axis=0), reference])
+        path = dtw_path(reference, delayed, band=10)
+
+        # Past the delay, frame i of the reference lines up with frame i + 5 of the copy
+        for i, j in path:
+            if j >= 5:
+                self.assertEqual(j - i, 5)
+
+    def test_empty_and_zip(self):
+        """Ensure empty inputs give an empty path and zip pairs frame i with frame i."""
+        self.assertEqual(dtw_path(np.zeros((0, 8)), np.zeros((5, 8)), band=3).shape, (0, 2))
+        np.testing.assert_array_equal(zip_path(3, 5), [[0, 0], [1, 1], [2, 2]])
+        with self.assertRaises(ValueError):
+            align_frames(np.zeros((3, 8)), np.zeros((3, 8)), mode="unknown")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from compare_queue import ComparisonExecutor, QueueFullError
+
+class TestComparisonExecutor(unittest.TestCase):
+
+    def setUp(self):
+        """Executor running at most 2 comparisons, accepting at most 3."""
+        self.executor = ComparisonExecutor(concurrency=2, limit=3)
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown()
+
+    def blocking_job(self, value):
+        self.started.release()
+        self.release.wait(10)
+        return value
+
+    def wait_for_free_slots(self, accepted=0):
+        """Slots are given back by a done callback, which may run just after result() returns."""
+        deadline = time.monotonic() + 5
+        while self.executor.stats()["running"] + self.executor.stats()["queued"] > accepted:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_rejects_beyond_limit(self):
+        """Ensure submissions past the limit raise QueueFullError instead of queueing."""
+        futures = [self.executor.submit(self.blocking_job, i) for i in range(3)]
+        for _ in range(2):
+            self.assertTrue(self.started.acquire(timeout=5))
+
+        self.assertTrue(self.executor.is_full())
+        self.assertEqual(self.executor.stats(), {"running": 2, "queued": 1, "concurrency": 2, "limit": 3})
+        with self.assertRaises(QueueFullError):
+            self.executor.submit(self.blocking_job, 3)
+
+        self.release.set()
+        self.assertEqual([future.result(timeout=5) for future in futures], [0, 1, 2])
+
+    def test_frees_slots_when_jobs_finish(self):
+        """Ensure finished and failed jobs give their slot back."""
+        def fail():
+            raise RuntimeError("boom")
+
+        self.release.set()
+        for _ in range(3):
+            futures = [self.executor.submit(self.blocking_job, 1), self.executor.submit(fail), self.executor.submit(self.blocking_job, 2)]
+            self.assertEqual(futures[0].result(timeout=5), 1)
+            with self.assertRaises(RuntimeError):
+                futures[1].result(timeout=5)
+            self.assertEqual(futures[2].result(timeout=5), 2)
+            self.wait_for_free_slots()
+
+        self.executor.shutdown()
+        self.assertFalse(self.executor.is_full())
+        self.assertEqual(self.executor.stats()["running"], 0)
+        self.assertEqual(self.executor.stats()["queued"], 0)
+
+    def test_cancelled_jobs_free_their_slot(self):
+        """Ensure a queued job that is cancelled before it runs gives its slot back."""
+        futures = [self.executor.submit(self.blocking_job, i) for i in range(3)]
+        for _ in range(2):
+            self.assertTrue(self.started.acquire(timeout=5))
+
+        self.assertTrue(futures[2].cancel())
+        self.assertFalse(self.executor.is_full())
+        self.assertEqual(self.executor.stats()["queued"], 0)
+        futures.append(self.executor.submit(self.blocking_job, 3))
+
+        self.release.set()
+        self.assertEqual(futures[3].result(timeout=5), 3)
+
+    def test_shutdown_frees_queued_slots(self):
+        """Ensure jobs cancelled by shutdown(cancel_futures=True) don't keep their slots."""
+        for i in range(3):
+            self.executor.submit(self.blocking_job, i)
+        for _ in range(2):
+            self.assertTrue(self.started.acquire(timeout=5))
+
+        # Shutting down cancels the queued job first, then waits for the running ones
+        threading.Timer(0.2, self.release.set).start()
+        self.executor.shutdown()
+        self.assertEqual(self.executor.stats()["running"], 0)
+        self.assertEqual(self.executor.stats()["queued"], 0)
+
+    def test_limit_is_at_least_concurrency(self):
+        """Ensure a limit below the concurrency still lets every worker be used."""
+        executor = ComparisonExecutor(concurrency=4, limit=1)
+        self.assertEqual(executor.limit, 4)
+        executor.shutdown()
+
+if __name__ == "__main__":
+    unittest.main()
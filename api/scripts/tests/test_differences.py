@@ -0,0 +1,141 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from compare_videos import calculate_differences, classify_distances, evaluate_video, JOINTS, THRESHOLDS, MAX_MISMATCHES
+from pose_extraction import NUM_LANDMARKS, LANDMARK_FIELDS
+
+def sample_keypoints(frames, seed):
+    """Random landmarks with some undetected frames, and one detected frame whose weighted joints are all zero."""
+    rng = np.random.default_rng(seed)
+    keypoints = rng.random((frames, NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32)
+    mask = rng.random(frames) > 0.2
+    keypoints[~mask] = 0
+    mask[3] = True
+    keypoints[3] = 0
+    return keypoints, mask
+
+def reference_differences(keypoints1, mask1, keypoints2, mask2, joints, path):
+    """The per-frame loop calculate_differences replaced, one aligned pair of frames at a time."""
+    differences = []
+    for i, j in path:
+        if not (mask1[i] and mask2[j]):
+            differences.append(None)
+            continue
+
+        vec1 = []
+        vec2 = []
+        weights = []
+        joint_differences = []
+        for joint_idx, _, weight in joints:
+            x1, y1 = float(keypoints1[i, joint_idx, 0]), float(keypoints1[i, joint_idx, 1])
+            x2, y2 = float(keypoints2[j, joint_idx, 0]), float(keypoints2[j, joint_idx, 1])
+            vec1.extend([x1, y1])
+            vec2.extend([x2, y2])
+            weights.extend([weight, weight])
+            joint_differences.append(((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5)
+
+        vec1_weighted = np.array(vec1) * np.array(weights)
+        vec2_weighted = np.array(vec2) * np.array(weights)
+        norm1 = np.linalg.norm(vec1_weighted)
+        norm2 = np.linalg.norm(vec2_weighted)
+        if norm1 == 0 or norm2 == 0:
+            cosine_distance = 1
+        else:
+            cosine_distance = 1 - np.dot(vec1_weighted, vec2_weighted) / (norm1 * norm2)
+        differences.append((cosine_distance, joint_differences))
+    return differences
+
+def reference_evaluation(differences, thresholds):
+    """The per-frame classification evaluate_video replaced: each distance checked against the thresholds in turn."""
+    evaluations = {"Excellent": 0, "Good": 0, "Fair": 0, "Poor": 0}
+    mismatches = []
+    for step, diff in enumerate(differences):
+        if diff is None:
+            continue
+        mean_diff = diff[0]
+        if mean_diff < thresholds["Good"]:
+            eval_type = "Excellent"
+        elif mean_diff < thresholds["Fair"]:
+            eval_type = "Good"
+        elif mean_diff < thresholds["Poor"]:
+            eval_type = "Fair"
+        else:
+            eval_type = "Poor"
+        evaluations[eval_type] += 1
+        if eval_type in ["Fair", "Poor"]:
+            mismatches.append((step, mean_diff, eval_type))
+    mismatches = sorted(mismatches, key=lambda mismatch: mismatch[1], reverse=True)[:MAX_MISMATCHES]
+    return evaluations, mismatches
+
+class TestVectorizedDifferences(unittest.TestCase):
+
+    def compare_with_reference(self, keypoints1, mask1, keypoints2, mask2, path):
+        distances, joint_distances = calculate_differences(keypoints1, mask1, keypoints2, mask2, JOINTS, path)
+        expected = reference_differences(keypoints1, mask1, keypoints2, mask2, JOINTS, path)
+
+        self.assertEqual(len(distances), len(expected))
+        for step, diff in enumerate(expected):
+            if diff is None:
+                self.assertTrue(np.isnan(distances[step]))
+                self.assertTrue(np.isnan(joint_distances[step]).all())
+            else:
+                self.assertAlmostEqual(distances[step], diff[0], delta=1e-12)
+                np.testing.assert_allclose(joint_distances[step], diff[1], atol=1e-12)
+        return distances, joint_distances, expected
+
+    def test_frame_by_frame(self):
+        """Ensure distances match the per-frame loop when frame i is compared with frame i."""
+        keypoints1, mask1 = sample_keypoints(40, seed=1)
+        keypoints2, mask2 = sample_keypoints(40, seed=2)
+        path = np.stack([np.arange(40), np.arange(40)], axis=1)
+        self.compare_with_reference(keypoints1, mask1, keypoints2, mask2, path)
+
+    def test_alignment_path(self):
+        """Ensure distances match the per-frame loop along a path that repeats frames of either video."""
+        keypoints1, mask1 = sample_keypoints(30, seed=3)
+        keypoints2, mask2 = sample_keypoints(25, seed=4)
+        rng = np.random.default_rng(5)
+        path = np.stack([np.sort(rng.integers(0, 30, 50)), np.sort(rng.integers(0, 25, 50))], axis=1)
+        self.compare_with_reference(keypoints1, mask1, keypoints2, mask2, path)
+
+    def test_evaluation_matches_reference(self):
+        """Ensure evaluations and mismatches (worst first, ties in frame order) match the per-frame loop."""
+        keypoints1, mask1 = sample_keypoints(60, seed=6)
+        keypoints2, mask2 = sample_keypoints(60, seed=7)
+        # The second video drifts further from the first frame by frame, so every label shows up
+        rng = np.random.default_rng(8)
+        noise = rng.normal(0, 1, keypoints1.shape) * np.linspace(0, 0.6, 60)[:, None, None]
+        keypoints2 = (keypoints1 + noise).astype(np.float32)
+        path = np.stack([np.arange(60), np.arange(60)], axis=1)
+        distances, joint_distances, expected = self.compare_with_reference(keypoints1, mask1, keypoints2, mask2, path)
+
+        result = evaluate_video(distances, joint_distances, 15.0, THRESHOLDS, JOINTS, path)
+        evaluations, mismatches = reference_evaluation(expected, THRESHOLDS)
+
+        self.assertEqual(result["evaluations"], evaluations)
+        self.assertTrue(all(evaluations.values()))
+        self.assertEqual(
+            [(mismatch["timestamp"], mismatch["evaluation"]) for mismatch in result["mismatches"]],
+            [(step / 15.0, eval_type) for step, _, eval_type in mismatches]
+        )
+        for mismatch, (_, mean_diff, _) in zip(result["mismatches"], mismatches):
+            self.assertAlmostEqual(mismatch["mean_difference"], mean_diff, delta=1e-12)
+
+    def test_thresholds_are_upper_exclusive(self):
+        """Ensure a distance exactly on a threshold gets the label above it, as with the per-frame < checks."""
+        distances = np.array([0.0, 0.10, 0.15, 0.25, 0.0999, 0.1499, 0.2499, 0.9])
+        labels = classify_distances(distances, THRESHOLDS)
+        self.assertEqual(labels.tolist(), [0, 1, 2, 3, 0, 1, 2, 3])
+
+        differences = [(distance, []) for distance in distances]
+        evaluations, mismatches = reference_evaluation(differences, THRESHOLDS)
+        result = evaluate_video(distances, np.zeros((len(distances), len(JOINTS))), 1.0, THRESHOLDS)
+        self.assertEqual(result["evaluations"], evaluations)
+        self.assertEqual([mismatch["timestamp"] for mismatch in result["mismatches"]], [step for step, _, _ in mismatches])
+
+if __name__ == "__main__":
+    unittest.main()
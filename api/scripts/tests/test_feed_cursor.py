@@ -0,0 +1,71 @@
+import os
+import sys
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from posts_event_crud import encode_feed_cursor, decode_feed_cursor, feed_after_id
+
+START = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+def make_posts(seed=0):
+    """Posts of both types with colliding timestamps and ids, in feed order (created_on, type, id)."""
+    rng = random.Random(seed)
+    posts = []
+    for post_type in ("user_post", "club_post"):
+        for post_id in rng.sample(range(1, 30), 20):
+            posts.append({"created_on": START + timedelta(seconds=rng.randint(0, 4)), "type": post_type, "id": post_id})
+    return sorted(posts, key=lambda post: (post["created_on"], post["type"], post["id"]))
+
+def posts_after(posts, after_created_on, after_type, after_id):
+    """What the feed query returns after a position: per table, (created_on, id) > (after_created_on, bound)."""
+    return [
+        post for post in posts
+        if (post["created_on"], post["id"]) > (after_created_on, feed_after_id(post["type"], after_type, after_id))
+    ]
+
+class TestFeedCursor(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Ensure a cursor decodes to the position of the post it was made from."""
+        post = {"created_on": START + timedelta(microseconds=123), "type": "club_post", "id": 42}
+        self.assertEqual(decode_feed_cursor(encode_feed_cursor(post)), (post["created_on"], "club_post", 42))
+
+    def test_rejects_invalid_cursors(self):
+        """Ensure malformed cursors raise ValueError (a 400 response), not a server error."""
+        for cursor in ("", "not base64!", "aGVsbG8=", "MjAyNS0wMy0wMXx1c2VyX3Bvc3R8eA=="):
+            with self.subTest(cursor):
+                with self.assertRaises(ValueError):
+                    decode_feed_cursor(cursor)
+
+    def test_pages_cover_feed_exactly_once(self):
+        """Ensure paging through posts with tied timestamps and ids visits every post once, in order."""
+        for seed in range(5):
+            posts = make_posts(seed)
+            for limit in (1, 3, 7):
+                seen = []
+                after = (START - timedelta(seconds=1), "", 0)
+                while True:
+                    page = posts_after(posts, *after)[:limit]
+                    seen += page
+                    if len(page) < limit:
+                        break
+                    after = decode_feed_cursor(encode_feed_cursor(page[-1]))
+                self.assertEqual(seen, posts)
+
+    def test_tie_breaking_between_post_types(self):
+        """Ensure at the cursor's timestamp, club posts come before user posts whatever their ids."""
+        # After a club post: the rest of the club posts by id, and every user post at the same timestamp
+        self.assertEqual(feed_after_id("club_post", "club_post", 10), 10)
+        self.assertEqual(feed_after_id("user_post", "club_post", 10), 0)
+        # After a user post: no club post at the same timestamp is left
+        self.assertEqual(feed_after_id("user_post", "user_post", 10), 10)
+        self.assertGreater(feed_after_id("club_post", "user_post", 10), 2**31 - 2)
+        # Without a cursor (type ""), everything at the start timestamp is included
+        self.assertEqual(feed_after_id("club_post", "", 0), 0)
+        self.assertEqual(feed_after_id("user_post", "", 0), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from pose_extraction import extract_segment, FrameBuffers
+
+VIDEO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "sample_videos", "vid5.mp4")
+
+# Analysed frames after which every buffer has been used at least once
+WARMUP_FRAMES = 10
+
+class NoPose:
+    """Stands in for a MediaPipe Pose that never finds anyone, so the test only exercises decoding."""
+
+    def process(self, frame_rgb):
+        return SimpleNamespace(pose_landmarks=None)
+
+class TestFrameBuffers(unittest.TestCase):
+
+    def extract(self, prefetch, max_dimension):
+        """Extracts VIDEO_PATH, returning the buffers' allocation count after warm-up and at the end, and the frame count."""
+        buffers = [FrameBuffers() for _ in range(prefetch + 2 if prefetch > 0 else 1)]
+        after_warmup = []
+
+        def progress(frames_done):
+            if frames_done == WARMUP_FRAMES:
+                after_warmup.append(sum(b.allocations for b in buffers))
+
+        keypoints, _, _ = extract_segment(VIDEO_PATH, NoPose(), progress=progress, max_dimension=max_dimension, buffers=buffers, prefetch=prefetch)
+        return after_warmup[0], sum(b.allocations for b in buffers), len(keypoints), buffers
+
+    def test_no_allocations_after_warmup(self):
+        """Ensure decoding allocates nothing per frame once every buffer has been used, inline or prefetched, resized or not."""
+        for prefetch in (0, 2):
+            for max_dimension in (None, 320):
+                with self.subTest(prefetch=prefetch, max_dimension=max_dimension):
+                    after_warmup, total, frames, buffers = self.extract(prefetch, max_dimension)
+
+                    self.assertGreater(frames, 10 * WARMUP_FRAMES)
+                    self.assertEqual(total, after_warmup)
+                    # One frame and one RGB image per buffer set, plus a downscaled image when resizing
+                    per_set = 3 if max_dimension is not None else 2
+                    self.assertEqual(total, per_set * len(buffers))
+                    for b in buffers:
+                        self.assertLess(b.allocations_per_frame(), 0.1)
+
+if __name__ == "__main__":
+    unittest.main()
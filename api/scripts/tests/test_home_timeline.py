@@ -0,0 +1,70 @@
+import os
+import sys
+import asyncio
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from timeline_crud import fetch_timeline_page
+
+START = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+class RecordedConnection:
+    """Stands in for an asyncpg connection: returns the given rows and records the query arguments."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.args = None
+
+    async def fetch(self, sql, *args):
+        self.args = args
+        return self.rows
+
+def timeline_row(seconds, post_type, post_id, deleted=False):
+    """A row of the timeline query; a deleted post has no columns from the posts tables."""
+    is_user_post = post_type == "user_post"
+    return {
+        "id": None if deleted else post_id,
+        "title": None if deleted else f"post {post_id}",
+        "owner": 7 if is_user_post and not deleted else None,
+        "club": 3 if not is_user_post and not deleted else None,
+        "description": None, "video_url": None, "picture_url": None, "event_id": None,
+        "created_on": START + timedelta(seconds=seconds),
+        "type": post_type,
+        "post_id": post_id,
+    }
+
+class TestFetchTimelinePage(unittest.TestCase):
+
+    def fetch(self, rows, limit):
+        conn = RecordedConnection(rows)
+        posts, last_entry = asyncio.run(fetch_timeline_page(conn, 5, (START, "", 0), 0, 0, limit))
+        return conn, posts, last_entry
+
+    def test_full_page_continues_after_its_last_entry(self):
+        """Ensure a full page points the next one after its last entry, without the internal post_id key."""
+        rows = [timeline_row(0, "club_post", 4), timeline_row(0, "user_post", 2), timeline_row(1, "user_post", 9)]
+        conn, posts, last_entry = self.fetch(rows, limit=3)
+
+        self.assertEqual([post["id"] for post in posts], [4, 2, 9])
+        self.assertTrue(all("post_id" not in post for post in posts))
+        self.assertEqual(last_entry, {"created_on": START + timedelta(seconds=1), "type": "user_post", "id": 9})
+        self.assertEqual(conn.args, (5, START, "", 0, 0, 0, 3))
+
+    def test_last_page_has_no_next(self):
+        """Ensure a page shorter than the limit is the last one."""
+        _, posts, last_entry = self.fetch([timeline_row(0, "user_post", 1)], limit=3)
+        self.assertEqual(len(posts), 1)
+        self.assertIsNone(last_entry)
+
+    def test_deleted_posts_are_skipped_but_paged_past(self):
+        """Ensure deleted posts are left out of the page while the cursor still moves past them."""
+        rows = [timeline_row(0, "user_post", 1), timeline_row(1, "club_post", 2, deleted=True)]
+        _, posts, last_entry = self.fetch(rows, limit=2)
+
+        self.assertEqual([post["id"] for post in posts], [1])
+        self.assertEqual(last_entry, {"created_on": START + timedelta(seconds=1), "type": "club_post", "id": 2})
+
+if __name__ == "__main__":
+    unittest.main()
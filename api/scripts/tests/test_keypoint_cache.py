@@ -0,0 +1,111 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from keypoint_cache import KeypointCache
+
+class TestKeypointCache(unittest.TestCase):
+
+    def setUp(self):
+        """Start every test from an empty cache directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_entry(self, seed):
+        rng = np.random.default_rng(seed)
+        return {
+            "keypoints": rng.random((20, 33, 4), dtype=np.float32),
+            "mask": rng.random(20) > 0.2,
+            "fps": np.float64(15.0),
+        }
+
+    def entry_size(self):
+        """Size on disk of one entry, to size the cache in entries."""
+        cache = KeypointCache(os.path.join(self.cache_dir, "probe"))
+        cache.put("probe", **self.make_entry(0))
+        return os.path.getsize(os.path.join(cache.cache_dir, "probe.npz"))
+
+    def set_access_time(self, cache, key, when):
+        path = os.path.join(cache.cache_dir, f"{key}.npz")
+        os.utime(path, (when, when))
+
+    def test_round_trip(self):
+        """Ensure stored arrays come back unchanged, and unknown keys miss."""
+        cache = KeypointCache(self.cache_dir)
+        entry = self.make_entry(1)
+        cache.put("a", **entry)
+
+        cached = cache.get("a")
+        np.testing.assert_array_equal(cached["keypoints"], entry["keypoints"])
+        np.testing.assert_array_equal(cached["mask"], entry["mask"])
+        self.assertEqual(float(cached["fps"]), 15.0)
+        self.assertIsNone(cache.get("missing"))
+
+    def test_evicts_least_recently_used(self):
+        """Ensure the entry read least recently is the one evicted when the cache overflows."""
+        cache = KeypointCache(os.path.join(self.cache_dir, "lru"), max_bytes=2 * self.entry_size())
+        cache.put("a", **self.make_entry(1))
+        cache.put("b", **self.make_entry(2))
+        self.set_access_time(cache, "a", 1000)
+        self.set_access_time(cache, "b", 2000)
+
+        # Reading "a" makes "b" the least recently used entry
+        self.assertIsNotNone(cache.get("a"))
+        cache.put("c", **self.make_entry(3))
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def test_truncated_entry_is_a_miss(self):
+        """Ensure a partially written entry reads as a miss instead of raising."""
+        cache = KeypointCache(self.cache_dir)
+        cache.put("a", **self.make_entry(1))
+        path = os.path.join(self.cache_dir, "a.npz")
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) // 2)
+
+        self.assertIsNone(cache.get("a"))
+
+    def test_entry_evicted_after_read_is_still_returned(self):
+        """Ensure an entry evicted between reading it and refreshing its access time is still a hit."""
+        cache = KeypointCache(self.cache_dir)
+        entry = self.make_entry(1)
+        cache.put("a", **entry)
+        path = os.path.join(self.cache_dir, "a.npz")
+
+        def evict_then_utime(evicted_path, times):
+            os.remove(evicted_path)
+            raise FileNotFoundError(evicted_path)
+
+        with mock.patch("keypoint_cache.os.utime", side_effect=evict_then_utime):
+            cached = cache.get("a")
+
+        np.testing.assert_array_equal(cached["keypoints"], entry["keypoints"])
+        self.assertFalse(os.path.exists(path))
+
+    def test_key_depends_on_content_and_settings(self):
+        """Ensure keys follow the video bytes, not the file name, and change with the settings."""
+        paths = []
+        for name, content in (("one.mp4", b"video"), ("two.mp4", b"video"), ("three.mp4", b"other")):
+            path = os.path.join(self.cache_dir, name)
+            with open(path, "wb") as f:
+                f.write(content)
+            paths.append(path)
+        cache = KeypointCache(os.path.join(self.cache_dir, "keys"))
+        settings = {"model_complexity": 1}
+
+        self.assertEqual(cache.key(paths[0], settings), cache.key(paths[1], settings))
+        self.assertNotEqual(cache.key(paths[0], settings), cache.key(paths[2], settings))
+        self.assertNotEqual(cache.key(paths[0], settings), cache.key(paths[0], {"model_complexity": 2}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import struct
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from landmark_format import encode_landmarks, decode_landmarks, LandmarkFormatError, LANDMARK_MAGIC
+from pose_extraction import NUM_LANDMARKS, LANDMARK_FIELDS
+
+def sample_landmarks(frames=13, seed=0):
+    rng = np.random.default_rng(seed)
+    keypoints = rng.random((frames, NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32)
+    mask = rng.random(frames) > 0.3
+    return keypoints, mask
+
+class TestLandmarkFormat(unittest.TestCase):
+
+    def test_round_trip(self):
+        """Ensure decoding gives back the encoded landmarks, to float16 precision, with undetected frames zeroed."""
+        keypoints, mask = sample_landmarks()
+        decoded, decoded_mask, fps = decode_landmarks(encode_landmarks(keypoints, mask, 15.0))
+
+        self.assertEqual(decoded.dtype, np.float32)
+        self.assertEqual(fps, 15.0)
+        np.testing.assert_array_equal(decoded_mask, mask)
+        np.testing.assert_allclose(decoded[mask], keypoints[mask], atol=1e-3)
+        self.assertFalse(decoded[~mask].any())
+
+    def test_mask_padding(self):
+        """Ensure frame counts that don't fill the last mask byte keep their mask."""
+        for frames in (1, 7, 8, 9, 16):
+            keypoints, mask = sample_landmarks(frames, seed=frames)
+            _, decoded_mask, _ = decode_landmarks(encode_landmarks(keypoints, mask, 30.0))
+            np.testing.assert_array_equal(decoded_mask, mask)
+
+    def test_rejects_malformed_data(self):
+        """Ensure truncated, padded, foreign and inconsistent blobs raise LandmarkFormatError."""
+        keypoints, mask = sample_landmarks()
+        blob = encode_landmarks(keypoints, mask, 15.0)
+        header = struct.Struct("<4sHHfIHH")
+        magic, version, flags, fps, frames, landmarks, fields = header.unpack_from(blob)
+
+        def with_header(**changes):
+            values = {"magic": magic, "version": version, "flags": flags, "fps": fps, "frames": frames,
+                      "landmarks": landmarks, "fields": fields, **changes}
+            return header.pack(*values.values()) + blob[header.size:]
+
+        bad_blobs = {
+            "empty": b"",
+            "short header": blob[:10],
+            "truncated data": blob[:-2],
+            "trailing bytes": blob + b"\x00",
+            "wrong magic": with_header(magic=b"NOPE"),
+            "unknown version": with_header(version=2),
+            "wrong landmark count": with_header(landmarks=17),
+            "zero fps": with_header(fps=0.0),
+            "huge fps": with_header(fps=10000.0),
+            "no frames": with_header(frames=0),
+            "frame count mismatch": with_header(frames=frames + 1),
+        }
+        for name, bad_blob in bad_blobs.items():
+            with self.subTest(name):
+                with self.assertRaises(LandmarkFormatError):
+                    decode_landmarks(bad_blob)
+
+        self.assertEqual(magic, LANDMARK_MAGIC)
+
+    def test_rejects_non_finite_coordinates(self):
+        """Ensure NaN or infinite coordinates of detected frames are rejected."""
+        keypoints, mask = sample_landmarks()
+        mask[0] = True
+        keypoints[0, 0, 0] = np.inf
+        with self.assertRaises(LandmarkFormatError):
+            decode_landmarks(encode_landmarks(keypoints, mask, 15.0))
+
+    def test_format_error_is_a_value_error(self):
+        """Ensure callers catching ValueError (mapped to 400 responses) also catch format errors."""
+        self.assertTrue(issubclass(LandmarkFormatError, ValueError))
+
+if __name__ == "__main__":
+    unittest.main()
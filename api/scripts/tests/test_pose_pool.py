@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+import pose_pool
+from pose_pool import PosePool, PosePoolExhaustedError
+
+FAST = {"model_complexity": 0, "min_detection_confidence": 0.5, "min_tracking_confidence": 0.5}
+ACCURATE = {"model_complexity": 2, "min_detection_confidence": 0.5, "min_tracking_confidence": 0.5}
+
+class StubPose:
+    """Stands in for mp_pose.Pose, recording how it was built and used."""
+
+    def __init__(self, fail_reset=False, **settings):
+        self.settings = settings
+        self.resets = 0
+        self.closed = False
+        self.fail_reset = fail_reset
+
+    def reset(self):
+        if self.fail_reset:
+            raise RuntimeError("graph is broken")
+        self.resets += 1
+
+    def close(self):
+        self.closed = True
+
+class TestPosePool(unittest.TestCase):
+
+    def setUp(self):
+        """Pool of at most 2 models per configuration, building stub models instead of MediaPipe ones."""
+        patcher = mock.patch.object(pose_pool, "mp_pose", SimpleNamespace(Pose=StubPose))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = PosePool(max_size=2)
+
+    def test_reuses_released_models(self):
+        """Ensure a released model is handed out again, with its tracking state reset, instead of building another."""
+        pose = self.pool.acquire(FAST)
+        self.pool.release(pose, FAST)
+        self.assertEqual(pose.resets, 1)
+
+        self.assertIs(self.pool.acquire(FAST), pose)
+        self.assertEqual(self.pool.stats()["configs"][0]["size"], 1)
+
+    def test_models_are_keyed_by_settings(self):
+        """Ensure callers asking for different settings never share a model."""
+        fast = self.pool.acquire(FAST)
+        self.pool.release(fast, FAST)
+        accurate = self.pool.acquire(ACCURATE)
+
+        self.assertIsNot(accurate, fast)
+        self.assertEqual(accurate.settings, ACCURATE)
+        # Same settings in another order are the same configuration
+        self.assertIs(self.pool.acquire(dict(reversed(list(FAST.items())))), fast)
+        self.assertEqual(len(self.pool.stats()["configs"]), 2)
+
+    def test_acquire_times_out_when_exhausted(self):
+        """Ensure acquiring from a full configuration waits up to the timeout, then raises PosePoolExhaustedError."""
+        poses = [self.pool.acquire(FAST) for _ in range(2)]
+        # Another configuration still has room
+        self.pool.release(self.pool.acquire(ACCURATE), ACCURATE)
+
+        started = time.monotonic()
+        with self.assertRaises(PosePoolExhaustedError):
+            self.pool.acquire(FAST, timeout=0.1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        with self.assertRaises(PosePoolExhaustedError):
+            self.pool.acquire(FAST, timeout=0)
+        self.assertEqual(self.pool.stats()["waits"], 2)
+
+        # A model released while waiting is handed to the waiter
+        threading.Timer(0.05, self.pool.release, args=(poses[0], FAST)).start()
+        self.assertIs(self.pool.acquire(FAST, timeout=5), poses[0])
+
+    def test_broken_models_are_dropped(self):
+        """Ensure a model whose reset fails is closed and its slot freed, rather than handed out again."""
+        broken = StubPose(fail_reset=True, **FAST)
+        with mock.patch.object(pose_pool, "mp_pose", SimpleNamespace(Pose=lambda **settings: broken)):
+            pose = self.pool.acquire(FAST)
+        self.pool.release(pose, FAST)
+
+        self.assertTrue(broken.closed)
+        self.assertIsNot(self.pool.acquire(FAST), broken)
+        self.assertEqual(self.pool.stats()["configs"][0]["in_use"], 1)
+
+    def test_context_manager_releases_on_error(self):
+        """Ensure `with pool.pose(settings)` gives the model back even if the block raises."""
+        with self.assertRaises(ValueError):
+            with self.pool.pose(FAST) as pose:
+                raise ValueError("bad frame")
+        self.assertEqual(pose.resets, 1)
+        self.assertEqual(self.pool.stats()["configs"][0]["idle"], 1)
+
+if __name__ == "__main__":
+    unittest.main()
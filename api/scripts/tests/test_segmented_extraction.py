@@ -0,0 +1,103 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+import extraction_pool
+from extraction_pool import ExtractionPool, plan_segments
+from pose_extraction import probe_video, NUM_LANDMARKS, LANDMARK_FIELDS
+
+VIDEO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "sample_videos", "vid4.mp4")
+
+def frame_signature(frame_rgb):
+    """A few pixels of the frame, which tell frames apart without depending on anything seen before."""
+    return frame_rgb[::37, ::53].reshape(-1)[:NUM_LANDMARKS * LANDMARK_FIELDS].astype(np.float32) / 255
+
+class StubPose:
+    """Stands in for a MediaPipe Pose: landmarks come from the frame's pixels, and frames in `dropped` get no pose."""
+
+    def __init__(self, dropped=()):
+        self.dropped = dropped
+
+    def process(self, frame_rgb):
+        values = frame_signature(frame_rgb)
+        if values.tobytes() in self.dropped:
+            return SimpleNamespace(pose_landmarks=None)
+        landmarks = [SimpleNamespace(x=x, y=y, z=z, visibility=visibility) for x, y, z, visibility in values.reshape(NUM_LANDMARKS, LANDMARK_FIELDS)]
+        return SimpleNamespace(pose_landmarks=SimpleNamespace(landmark=landmarks))
+
+class StubPosePool:
+
+    def __init__(self, pose):
+        self._pose = pose
+
+    @contextmanager
+    def pose(self, settings):
+        yield self._pose
+
+class TestSegmentedExtraction(unittest.TestCase):
+
+    def extract(self, pose, segments):
+        """Extracts VIDEO_PATH in `segments` segments on worker threads, through the pool's own stitching."""
+        pool = ExtractionPool(workers=0)
+        if segments > 1:
+            pool.workers = segments
+            pool._executor = ThreadPoolExecutor(max_workers=segments)
+        with mock.patch.object(extraction_pool, "get_pose_pool", return_value=StubPosePool(pose)):
+            try:
+                return pool.extract(VIDEO_PATH, segments=segments)
+            finally:
+                pool.shutdown()
+
+    def test_segments_stitch_to_a_single_pass(self):
+        """Ensure stitching segments gives the same keypoints, mask and fps as extracting the video in one pass."""
+        keypoints, mask, fps = self.extract(StubPose(), 1)
+        self.assertTrue(mask.all())
+
+        for segments in (2, 3, 5):
+            with self.subTest(segments=segments):
+                segmented_keypoints, segmented_mask, segmented_fps = self.extract(StubPose(), segments)
+                self.assertEqual(segmented_fps, fps)
+                np.testing.assert_array_equal(segmented_mask, mask)
+                np.testing.assert_array_equal(segmented_keypoints, keypoints)
+
+    def test_boundaries_on_dropped_frames(self):
+        """Ensure frames without a pose right at segment boundaries stay in place, zeroed and masked out."""
+        keypoints, _, fps = self.extract(StubPose(), 1)
+        _, frame_estimate = probe_video(VIDEO_PATH, fps)
+        boundaries = [start for start, _ in plan_segments(frame_estimate, 3)[1:]]
+        dropped_frames = sorted({frame for start in boundaries for frame in (start - 1, start)})
+        dropped = {keypoints[frame].reshape(-1).tobytes() for frame in dropped_frames}
+
+        expected_keypoints, expected_mask, _ = self.extract(StubPose(dropped), 1)
+        self.assertFalse(expected_mask[dropped_frames].any())
+
+        segmented_keypoints, segmented_mask, _ = self.extract(StubPose(dropped), 3)
+        np.testing.assert_array_equal(segmented_mask, expected_mask)
+        np.testing.assert_array_equal(segmented_keypoints, expected_keypoints)
+        self.assertFalse(segmented_keypoints[dropped_frames].any())
+
+    def test_plan_segments(self):
+        """Ensure segments cover every frame once, with the last one left open for an undercounted estimate."""
+        self.assertEqual(plan_segments(10, 1), [(0, None)])
+        self.assertEqual(plan_segments(10, 3), [(0, 3), (3, 7), (7, None)])
+
+    def test_segment_count(self):
+        """Ensure only videos long enough are split, and never into more segments than there are workers per video."""
+        pool = ExtractionPool(workers=0)
+        pool.workers = 8
+        with mock.patch.object(extraction_pool, "MIN_SEGMENT_SECONDS", 30):
+            self.assertEqual(pool._segment_count(15, 15 * 20, 1), 1)
+            self.assertEqual(pool._segment_count(15, 15 * 95, 1), 3)
+            self.assertEqual(pool._segment_count(15, 15 * 600, 1), 8)
+            self.assertEqual(pool._segment_count(15, 15 * 600, 2), 4)
+            self.assertEqual(pool._segment_count(15, 15 * 600, 16), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from compare_videos import StreamingComparator, DTW_BAND_SECONDS
+from live_compare import parse_landmarks, parse_timestamp
+from pose_extraction import NUM_LANDMARKS, LANDMARK_FIELDS
+
+REFERENCE_FPS = 15.0
+REFERENCE_SECONDS = 10
+
+def reference_sequence(seed=0):
+    """A reference whose every frame is a different random pose, so only the matching frame scores well."""
+    rng = np.random.default_rng(seed)
+    frames = int(REFERENCE_FPS * REFERENCE_SECONDS)
+    keypoints = rng.random((frames, NUM_LANDMARKS, LANDMARK_FIELDS), dtype=np.float32)
+    return keypoints, np.ones(frames, dtype=bool)
+
+def perform(comparator, keypoints, camera_fps, lag_frames=0):
+    """Pushes what a camera at camera_fps sees of a student copying the reference lag_frames reference frames late."""
+    scores = []
+    for i in range(int(camera_fps * (REFERENCE_SECONDS - 1))):
+        timestamp = i / camera_fps
+        reference_frame = int(round(timestamp * REFERENCE_FPS)) - lag_frames
+        landmarks = keypoints[reference_frame] if reference_frame >= 0 else None
+        scores.append(comparator.push(landmarks, timestamp))
+    return scores
+
+class TestStreamingComparator(unittest.TestCase):
+
+    def test_camera_rates(self):
+        """Ensure a student copying the reference scores Excellent at every camera frame rate, matched to the right moment."""
+        keypoints, mask = reference_sequence()
+        for camera_fps in (10.0, 15.0, 24.0, 30.0, 60.0):
+            with self.subTest(camera_fps=camera_fps):
+                comparator = StreamingComparator(keypoints, mask, REFERENCE_FPS)
+                scores = perform(comparator, keypoints, camera_fps)
+
+                self.assertEqual({score["evaluation"] for score in scores}, {"Excellent"})
+                for score in scores:
+                    self.assertLess(score["difference"], 1e-6)
+                    self.assertAlmostEqual(score["reference_timestamp"], score["timestamp"], delta=0.5 / REFERENCE_FPS + 1e-9)
+                    self.assertFalse(score["finished"])
+
+                summary = comparator.summary()
+                self.assertEqual(summary["evaluations"]["Excellent"], len(scores))
+                self.assertTrue(summary["is_matching"])
+
+    def test_follows_a_late_student(self):
+        """Ensure a student lagging within the alignment band is matched to what they are copying once the window sees it."""
+        keypoints, mask = reference_sequence(seed=1)
+        comparator = StreamingComparator(keypoints, mask, REFERENCE_FPS)
+        scores = perform(comparator, keypoints, 30.0, lag_frames=9)
+        self.assertLess(9 / REFERENCE_FPS, DTW_BAND_SECONDS)
+
+        # Past the first second every frame is matched to the reference 0.6 s earlier
+        settled = [score for score in scores if score["timestamp"] >= 1.0]
+        self.assertEqual({score["evaluation"] for score in settled}, {"Excellent"})
+        for score in settled:
+            self.assertAlmostEqual(score["timestamp"] - score["reference_timestamp"], 0.6, delta=1 / REFERENCE_FPS)
+
+    def test_counting_frames_would_run_ahead(self):
+        """Without timestamps frames count as reference frames, so a 30 fps camera outruns the band and scores badly."""
+        keypoints, mask = reference_sequence(seed=2)
+        comparator = StreamingComparator(keypoints, mask, REFERENCE_FPS)
+        scores = [comparator.push(keypoints[int(round(i / 30.0 * REFERENCE_FPS))]) for i in range(120)]
+        self.assertIn("Poor", {score["evaluation"] for score in scores[60:]})
+
+    def test_undetected_frames_are_not_scored(self):
+        """Ensure frames without a pose get no evaluation and don't count in the summary."""
+        keypoints, mask = reference_sequence()
+        comparator = StreamingComparator(keypoints, mask, REFERENCE_FPS)
+        score = comparator.push(None, 0.0)
+        self.assertIsNone(score["evaluation"])
+        self.assertEqual(sum(comparator.summary()["evaluations"].values()), 0)
+
+class TestLiveFrameValidation(unittest.TestCase):
+
+    def test_rejects_non_finite_landmarks(self):
+        """Ensure NaN and infinite coordinates are refused before they reach the distance math."""
+        landmarks = np.zeros((NUM_LANDMARKS, LANDMARK_FIELDS)).tolist()
+        self.assertEqual(parse_landmarks(landmarks).shape, (NUM_LANDMARKS, LANDMARK_FIELDS))
+        self.assertIsNone(parse_landmarks(None))
+        for bad in (float("nan"), float("inf"), float("-inf")):
+            landmarks[5][1] = bad
+            with self.subTest(bad):
+                with self.assertRaises(ValueError):
+                    parse_landmarks(landmarks)
+
+    def test_timestamps(self):
+        """Ensure client timestamps are used when valid, and arrival time is used when there is none."""
+        self.assertEqual(parse_timestamp(1.25, 3.0), 1.25)
+        self.assertEqual(parse_timestamp(None, 3.0), 3.0)
+        for bad in (float("nan"), float("inf"), -1, "1.0", True):
+            with self.subTest(bad):
+                with self.assertRaises(ValueError):
+                    parse_timestamp(bad, 3.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from ttl_cache import TTLCache
+from search import normalize_search_query, like_pattern, SEARCH_MIN_QUERY_LENGTH
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_get_and_put(self):
+        """Ensure stored values are returned and misses give None, with hits and misses counted."""
+        cache = TTLCache(max_size=4, ttl_seconds=60)
+        cache.put("users:dan", [1, 2])
+
+        self.assertEqual(cache.get("users:dan"), [1, 2])
+        self.assertIsNone(cache.get("users:ann"))
+        self.assertEqual(cache.stats(), {"size": 1, "max_size": 4, "hits": 1, "misses": 1})
+
+    def test_evicts_least_recently_used(self):
+        """Ensure a full cache drops the entry read least recently, not the oldest one stored."""
+        cache = TTLCache(max_size=2, ttl_seconds=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_entries_expire(self):
+        """Ensure entries are dropped once ttl_seconds have passed, and storing again refreshes them."""
+        cache = TTLCache(max_size=4, ttl_seconds=0.05)
+        cache.put("a", 1)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+        cache.put("a", 2)
+        self.assertEqual(cache.get("a"), 2)
+
+    def test_zero_size_disables_caching(self):
+        """Ensure max_size 0 turns the cache off instead of failing."""
+        cache = TTLCache(max_size=0, ttl_seconds=60)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_clear(self):
+        cache = TTLCache(max_size=4, ttl_seconds=60)
+        cache.put("a", 1)
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+
+class TestSearchQuery(unittest.TestCase):
+
+    def test_normalize(self):
+        """Ensure queries are trimmed and lowercased, so equal searches share a cache entry."""
+        self.assertEqual(normalize_search_query("  DanCe "), "dance")
+        with self.assertRaises(ValueError):
+            normalize_search_query(" " + "a" * (SEARCH_MIN_QUERY_LENGTH - 1) + " ")
+
+    def test_like_pattern_escapes_wildcards(self):
+        """Ensure % and _ in a query match themselves rather than anything."""
+        self.assertEqual(like_pattern("dan"), "%dan%")
+        self.assertEqual(like_pattern("50%_off\\"), "%50\\%\\_off\\\\%")
+
+if __name__ == "__main__":
+    unittest.main()
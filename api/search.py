@@ -0,0 +1,25 @@
+import os
+from ttl_cache import TTLCache
+
+SEARCH_MIN_QUERY_LENGTH = 3
+
+# Most results returned by one search
+SEARCH_RESULTS_LIMIT = int(os.environ.get("SEARCH_RESULTS_LIMIT", "20"))
+
+# Results of recent searches are reused for this many seconds, e.g. while someone types
+SEARCH_CACHE_TTL_SECONDS = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "30"))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "1024"))
+
+search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS)
+
+# Function to validate a search query, returning it normalized for matching and caching
+def normalize_search_query(query: str):
+    query = query.strip().lower()
+    if len(query) < SEARCH_MIN_QUERY_LENGTH:
+        raise ValueError(f"Search query must be at least {SEARCH_MIN_QUERY_LENGTH} characters long")
+    return query
+
+# Function to escape the LIKE wildcards in a query, so "_" and "%" match themselves
+def like_pattern(query: str):
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
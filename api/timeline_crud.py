@@ -0,0 +1,233 @@
+import os
+from db_connect import connect
+
+# Table name MACROS
+USERS_TABLE = "users"
+USER_FOLLOWINGS_TABLE = "user_following"
+USER_POSTS_TABLE = "user_posts"
+CLUB_POSTS_TABLE = "club_posts"
+MEMBERSHIPS_TABLE = "membership"
+HOME_TIMELINE_TABLE = "home_timeline"
+TIMELINE_PULL_SOURCES_TABLE = "timeline_pull_sources"
+
+# Serve /posts from the precomputed timelines rather than computing feeds at read time
+HOME_TIMELINE_ENABLED = os.environ.get("HOME_TIMELINE_ENABLED", "false").lower() == "true"
+
+# Keep the timelines up to date as posts are made and users follow, unfollow, join or leave.
+# Always on when they are read from
+HOME_TIMELINE_WRITES_ENABLED = HOME_TIMELINE_ENABLED or os.environ.get("HOME_TIMELINE_WRITES_ENABLED", "false").lower() == "true"
+
+# Accounts and clubs with more followers / members than this are merged in at read time
+TIMELINE_FANOUT_MAX_FOLLOWERS = int(os.environ.get("TIMELINE_FANOUT_MAX_FOLLOWERS", "5000"))
+
+# Newest posts of an account or club copied into a timeline when someone follows or joins it. Bounds
+# the work done in the follow request; older posts only come back with a rebuild_timelines()
+TIMELINE_FOLLOW_BACKFILL_POSTS = int(os.environ.get("TIMELINE_FOLLOW_BACKFILL_POSTS", "200"))
+
+# Users whose timelines are rebuilt per transaction by rebuild_timelines()
+TIMELINE_BACKFILL_BATCH_SIZE = 500
+
+# First key of the per-source advisory locks (the second is the source's id)
+TIMELINE_LOCK_IDS = {"user": 735210, "club": 735211}
+
+# For each kind of source: its posts table and post type, the column of the posts naming the source,
+# and the table linking sources to the users who see their posts
+TIMELINE_SOURCES = {
+    "user": {
+        "posts_table": USER_POSTS_TABLE, "post_type": "user_post", "author_column": "owner",
+        "links_table": USER_FOLLOWINGS_TABLE, "source_column": "following_id",
+    },
+    "club": {
+        "posts_table": CLUB_POSTS_TABLE, "post_type": "club_post", "author_column": "club",
+        "links_table": MEMBERSHIPS_TABLE, "source_column": "club_id",
+    },
+}
+
+# Function to serialize the timeline writes of one source until the end of the transaction. Without it a
+# follow and a new post committing at the same time would each miss the other's row, and the post would
+# never reach the new follower's timeline.
+def lock_source(cursor, source_type: str, source_id: int):
+    cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", (TIMELINE_LOCK_IDS[source_type], source_id))
+
+# Function to check whether a source's posts are merged in at read time, marking it as such if it became too big
+def is_pull_source(cursor, source_type: str, source_id: int):
+    cursor.execute(
+        f"SELECT 1 FROM {TIMELINE_PULL_SOURCES_TABLE} WHERE source_type = %s AND source_id = %s",
+        (source_type, source_id)
+    )
+    if cursor.fetchone() is not None:
+        return True
+
+    # Stop counting as soon as the source is known to be too big
+    source = TIMELINE_SOURCES[source_type]
+    cursor.execute(f"""
+        SELECT count(*) FROM (
+            SELECT 1 FROM {source['links_table']} WHERE {source['source_column']} = %s LIMIT %s
+        ) AS followers
+    """, (source_id, TIMELINE_FANOUT_MAX_FOLLOWERS + 1))
+    if cursor.fetchone()[0] <= TIMELINE_FANOUT_MAX_FOLLOWERS:
+        return False
+
+    cursor.execute(
+        f"INSERT INTO {TIMELINE_PULL_SOURCES_TABLE} (source_type, source_id) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+        (source_type, source_id)
+    )
+    return True
+
+# Function to add a new post to the timelines of its author's followers (or its club's members).
+# Runs on the caller's cursor, so the post and its fan-out are committed together.
+def fan_out_post(cursor, source_type: str, source_id: int, post_id: int, created_on):
+    if not HOME_TIMELINE_WRITES_ENABLED:
+        return
+    lock_source(cursor, source_type, source_id)
+    if is_pull_source(cursor, source_type, source_id):
+        return
+
+    source = TIMELINE_SOURCES[source_type]
+    cursor.execute(f"""
+        INSERT INTO {HOME_TIMELINE_TABLE} (user_id, created_on, post_type, post_id)
+        SELECT user_id, %s, %s, %s FROM {source['links_table']} WHERE {source['source_column']} = %s
+        ON CONFLICT DO NOTHING
+    """, (created_on, source["post_type"], post_id, source_id))
+
+# Function to copy a source's newest posts into a user's timeline after they follow or join it
+def add_source_to_timeline(cursor, user_id: int, source_type: str, source_id: int):
+    if not HOME_TIMELINE_WRITES_ENABLED:
+        return
+    lock_source(cursor, source_type, source_id)
+    if is_pull_source(cursor, source_type, source_id):
+        return
+
+    source = TIMELINE_SOURCES[source_type]
+    cursor.execute(f"""
+        INSERT INTO {HOME_TIMELINE_TABLE} (user_id, created_on, post_type, post_id)
+        SELECT %s, created_on, %s, id FROM {source['posts_table']}
+        WHERE {source['author_column']} = %s
+        ORDER BY created_on DESC, id DESC
+        LIMIT %s
+        ON CONFLICT DO NOTHING
+    """, (user_id, source["post_type"], source_id, TIMELINE_FOLLOW_BACKFILL_POSTS))
+
+# Function to remove a source's posts from a user's timeline after they unfollow or leave it
+def remove_source_from_timeline(cursor, user_id: int, source_type: str, source_id: int):
+    if not HOME_TIMELINE_WRITES_ENABLED:
+        return
+    lock_source(cursor, source_type, source_id)
+    source = TIMELINE_SOURCES[source_type]
+    cursor.execute(f"""
+        DELETE FROM {HOME_TIMELINE_TABLE} t
+        USING {source['posts_table']} p
+        WHERE t.user_id = %s AND t.post_type = %s AND t.post_id = p.id AND p.{source['author_column']} = %s
+    """, (user_id, source["post_type"], source_id))
+
+# Function to rebuild timelines from the follows, memberships and posts tables: every user's by default,
+# in which case which sources are merged in at read time is recomputed too. Returns the number of users rebuilt.
+def rebuild_timelines(user_ids=None, batch_size: int = TIMELINE_BACKFILL_BATCH_SIZE, progress=None):
+    with connect() as conn:
+        with conn.cursor() as cursor:
+            if user_ids is None:
+                cursor.execute(f"DELETE FROM {TIMELINE_PULL_SOURCES_TABLE}")
+                for source_type, source in TIMELINE_SOURCES.items():
+                    cursor.execute(f"""
+                        INSERT INTO {TIMELINE_PULL_SOURCES_TABLE} (source_type, source_id)
+                        SELECT %s, {source['source_column']} FROM {source['links_table']}
+                        GROUP BY {source['source_column']}
+                        HAVING count(*) > %s
+                    """, (source_type, TIMELINE_FANOUT_MAX_FOLLOWERS))
+
+                cursor.execute(f"SELECT id FROM {USERS_TABLE} ORDER BY id")
+                user_ids = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = list(user_ids[start:start + batch_size])
+        with connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {HOME_TIMELINE_TABLE} WHERE user_id = ANY(%s)", (batch,))
+                for source_type, source in TIMELINE_SOURCES.items():
+                    cursor.execute(f"""
+                        INSERT INTO {HOME_TIMELINE_TABLE} (user_id, created_on, post_type, post_id)
+                        SELECT l.user_id, p.created_on, %s, p.id
+                        FROM {source['links_table']} l
+                        JOIN {source['posts_table']} p ON p.{source['author_column']} = l.{source['source_column']}
+                        WHERE l.user_id = ANY(%s)
+                        AND NOT EXISTS (
+                            SELECT 1 FROM {TIMELINE_PULL_SOURCES_TABLE} s
+                            WHERE s.source_type = %s AND s.source_id = l.{source['source_column']}
+                        )
+                        ON CONFLICT DO NOTHING
+                    """, (source["post_type"], batch, source_type))
+                conn.commit()
+        if progress is not None:
+            progress(min(start + batch_size, len(user_ids)), len(user_ids))
+
+    return len(user_ids)
+
+# One feed page of a user's timeline merged with the posts of the large sources they follow, with parameters
+# user_id, after_created_on, after_type, after_id, user_after_id, club_after_id and limit
+TIMELINE_PAGE_QUERY = f"""
+    WITH entries AS (
+        (
+            SELECT created_on, post_type, post_id FROM {HOME_TIMELINE_TABLE}
+            WHERE user_id = $1 AND (created_on, post_type, post_id) > ($2, $3, $4)
+            ORDER BY created_on, post_type, post_id
+            LIMIT $7
+        )
+        UNION
+        (
+            SELECT created_on, 'user_post', id FROM {USER_POSTS_TABLE}
+            WHERE owner IN (
+                SELECT f.following_id FROM {USER_FOLLOWINGS_TABLE} f
+                JOIN {TIMELINE_PULL_SOURCES_TABLE} s ON s.source_type = 'user' AND s.source_id = f.following_id
+                WHERE f.user_id = $1
+            )
+            AND (created_on, id) > ($2, $5)
+            ORDER BY created_on, id
+            LIMIT $7
+        )
+        UNION
+        (
+            SELECT created_on, 'club_post', id FROM {CLUB_POSTS_TABLE}
+            WHERE club IN (
+                SELECT m.club_id FROM {MEMBERSHIPS_TABLE} m
+                JOIN {TIMELINE_PULL_SOURCES_TABLE} s ON s.source_type = 'club' AND s.source_id = m.club_id
+                WHERE m.user_id = $1
+            )
+            AND (created_on, id) > ($2, $6)
+            ORDER BY created_on, id
+            LIMIT $7
+        )
+        ORDER BY created_on, post_type, post_id
+        LIMIT $7
+    )
+    SELECT COALESCE(u.id, c.id) AS id, COALESCE(u.title, c.title) AS title, u.owner, c.club,
+        COALESCE(u.description, c.description) AS description, COALESCE(u.video_url, c.video_url) AS video_url,
+        COALESCE(u.picture_url, c.picture_url) AS picture_url, c.event_id, e.created_on, e.post_type AS type,
+        e.post_id
+    FROM entries e
+    LEFT JOIN {USER_POSTS_TABLE} u ON e.post_type = 'user_post' AND u.id = e.post_id
+    LEFT JOIN {CLUB_POSTS_TABLE} c ON e.post_type = 'club_post' AND c.id = e.post_id
+    ORDER BY e.created_on, e.post_type, e.post_id
+"""
+
+# Function to read one feed page from a user's timeline, merged with the posts of the large sources they follow.
+# after is the (created_on, type, id) the page starts after, and user_after_id / club_after_id the
+# matching (created_on, id) bounds for each posts table (see fetch_posts). Returns the posts, and the
+# (created_on, type, id) of the page's last entry if the page is full (None on the last page).
+async def fetch_timeline_page(conn, user_id: int, after, user_after_id: int, club_after_id: int, limit: int):
+    after_created_on, after_type, after_id = after
+    rows = await conn.fetch(TIMELINE_PAGE_QUERY, user_id, after_created_on, after_type, after_id, user_after_id, club_after_id, limit)
+
+    last_entry = None
+    if len(rows) == limit:
+        last_entry = {"created_on": rows[-1]["created_on"], "type": rows[-1]["type"], "id": rows[-1]["post_id"]}
+
+    posts = []
+    for row in rows:
+        # Skip entries whose post has since been deleted
+        if row["id"] is None:
+            continue
+        post = dict(row)
+        del post["post_id"]
+        posts.append(post)
+    return posts, last_entry
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from fastapi import UploadFile
+
+# Size of each read when copying an upload to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Largest video accepted per file
+MAX_VIDEO_UPLOAD_MB = int(os.environ.get("MAX_VIDEO_UPLOAD_MB", "500"))
+MAX_VIDEO_UPLOAD_BYTES = MAX_VIDEO_UPLOAD_MB * 1024 * 1024
+
+# Largest landmark upload accepted per file (an hour at 30 fps is about 30 MB)
+MAX_LANDMARK_UPLOAD_MB = int(os.environ.get("MAX_LANDMARK_UPLOAD_MB", "32"))
+MAX_LANDMARK_UPLOAD_BYTES = MAX_LANDMARK_UPLOAD_MB * 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+async def save_upload(upload: UploadFile, folder: str, max_bytes: int = MAX_VIDEO_UPLOAD_BYTES):
+    '''
+    Streams an upload to a uniquely named file in folder, in fixed-size chunks so memory use
+    does not depend on the size of the video. Raises UploadTooLargeError (and leaves nothing
+    behind) if the upload is bigger than max_bytes. Returns the path of the saved file.
+    '''
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(f"'{upload.filename}' is larger than {max_bytes // (1024 * 1024)} MB")
+
+    # Keep the extension so OpenCV can pick the right demuxer; the name itself is never trusted
+    fd, path = tempfile.mkstemp(dir=folder, suffix=os.path.splitext(upload.filename or "")[1])
+    try:
+        written = 0
+        with os.fdopen(fd, "wb") as f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLargeError(f"'{upload.filename}' is larger than {max_bytes // (1024 * 1024)} MB")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    return path
+
+async def read_upload(upload: UploadFile, max_bytes: int = MAX_LANDMARK_UPLOAD_BYTES):
+    '''
+    Reads a small upload into memory, raising UploadTooLargeError if it is bigger than max_bytes
+    '''
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(f"'{upload.filename}' is larger than {max_bytes // (1024 * 1024)} MB")
+
+    data = await upload.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise UploadTooLargeError(f"'{upload.filename}' is larger than {max_bytes // (1024 * 1024)} MB")
+    return data
@@ -0,0 +1,20 @@
+-- Indexes for the feed, events, followers and membership lookups.
+-- init.sql only has primary keys and UNIQUE constraints, so these queries scanned whole tables.
+
+-- Feed (fetch_posts): posts of the users someone follows, in (created_on, id) order
+CREATE INDEX IF NOT EXISTS user_posts_owner_created_on_idx ON public.user_posts (owner, created_on, id);
+
+-- Feed (fetch_posts): posts of the clubs someone is a member of, in (created_on, id) order
+CREATE INDEX IF NOT EXISTS club_posts_club_created_on_idx ON public.club_posts (club, created_on, id);
+
+-- Events of a club or of someone's clubs, created after a timestamp
+CREATE INDEX IF NOT EXISTS events_club_created_on_idx ON public.events (club, created_on);
+
+-- Followers of a user. UNIQUE (user_id, following_id) already covers the followings
+CREATE INDEX IF NOT EXISTS user_following_following_id_idx ON public.user_following (following_id);
+
+-- Users interested in an event. The primary key (user_id, event_id) already covers a user's events
+CREATE INDEX IF NOT EXISTS event_interest_event_id_idx ON public.event_interest (event_id);
+
+-- Members of a club. UNIQUE (user_id, club_id) already covers a user's clubs
+CREATE INDEX IF NOT EXISTS membership_club_id_idx ON public.membership (club_id);
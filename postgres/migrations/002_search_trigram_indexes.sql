@@ -0,0 +1,11 @@
+-- Trigram indexes for user and club search (search_users_db, search_clubs_db).
+-- Substring matches (ILIKE '%query%') can't use a B-tree index; GIN trigram indexes serve them
+-- for queries of three characters or more.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS users_username_trgm_idx ON public.users USING GIN (username gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS clubs_name_trgm_idx ON public.clubs USING GIN (name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS clubs_club_tag_trgm_idx ON public.clubs USING GIN (club_tag gin_trgm_ops);
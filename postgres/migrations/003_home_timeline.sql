@@ -0,0 +1,17 @@
+-- Precomputed home timelines (fan-out on write), see timeline_crud.py.
+-- One row per post in each follower's / member's feed, keyed in feed order so a page is one index range read.
+CREATE TABLE IF NOT EXISTS public.home_timeline(
+    "user_id" INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    "created_on" TIMESTAMP WITH TIME ZONE NOT NULL,
+    "post_type" VARCHAR(10) NOT NULL, -- user_post or club_post
+    "post_id" INTEGER NOT NULL,
+    PRIMARY KEY ("user_id", "created_on", "post_type", "post_id")
+);
+
+-- Accounts and clubs with too many followers / members to fan out to. Their posts are merged
+-- into feeds at read time instead.
+CREATE TABLE IF NOT EXISTS public.timeline_pull_sources(
+    "source_type" VARCHAR(10) NOT NULL, -- user or club
+    "source_id" INTEGER NOT NULL,
+    PRIMARY KEY ("source_type", "source_id")
+);
@@ -0,0 +1,19 @@
+-- Queue of video comparison jobs, processed by compare_worker.py.
+-- Used to live in init.sql, which only runs on an empty volume, so existing databases never got it.
+CREATE TABLE IF NOT EXISTS public.compare_jobs(
+    "id" SERIAL PRIMARY KEY,
+    "status" VARCHAR(20) NOT NULL, -- queued, running, done or failed
+    "video1_path" VARCHAR(1000) NOT NULL,
+    "video2_path" VARCHAR(1000) NOT NULL,
+    "alignment" VARCHAR(20) NOT NULL,
+    "frames_processed" INTEGER NOT NULL DEFAULT 0,
+    "frames_total" INTEGER NOT NULL DEFAULT 0,
+    "attempts" INTEGER NOT NULL DEFAULT 0,
+    "result" JSON,
+    "error" VARCHAR(2000),
+    "created_on" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    "updated_on" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- Quality profile of the job, see QUALITY_PROFILES in pose_extraction.py. Added after the table first shipped
+ALTER TABLE public.compare_jobs ADD COLUMN IF NOT EXISTS "quality" VARCHAR(20) NOT NULL DEFAULT 'balanced';